@@ -1,10 +1,10 @@
 
 from typing import final, List, Dict, Final
-import enum, random
+import enum
 from bw4t.BW4TBrain import BW4TBrain
 from matrx.agents.agent_utils.state import State
-from matrx.agents.agent_utils.navigator import Navigator
-from matrx.agents.agent_utils.state_tracker import StateTracker
+from bw4t.NavigationCache import NavigationCache
+from bw4t.TrustModel import TrustModel
 from matrx.actions.door_actions import OpenDoorAction
 from matrx.actions.object_actions import GrabObject, DropObject
 from matrx.messages.message import Message
@@ -19,14 +19,19 @@ class BaseLineAgent(BW4TBrain):
 
     def __init__(self, settings:Dict[str,object]):
         super().__init__(settings)
-        self._phase = Phase.PLAN_PATH_TO_CLOSED_DOOR
-        self._teamMembers = []
 
     def initialize(self):
         super().initialize()
-        self._state_tracker = StateTracker(agent_id=self.agent_id)
-        self._navigator = Navigator(agent_id=self.agent_id, 
-            action_set=self.action_set, algorithm=Navigator.A_STAR_ALGORITHM)
+        self._phase = Phase.PLAN_PATH_TO_CLOSED_DOOR
+        self._teamMembers = []
+        # Shared distance fields of the world, set on the first tick
+        self._navigation = None
+        # Reads only the messages that arrived since the previous tick
+        self._inboxCursor = self.inbox.cursor()
+        # Trust in the team members
+        # You can change the default value to your preference
+        self._trust = TrustModel(default=0.5)
+        self._distrusted = set()
 
     def filter_bw4t_observations(self, state):
         return state
@@ -41,30 +46,37 @@ class BaseLineAgent(BW4TBrain):
         receivedMessages = self._processMessages(self._teamMembers)
         # Update trust beliefs for team members
         self._trustBlief(self._teamMembers, receivedMessages)
+        # Keep the navigation up to date with the doors
+        if self._navigation is None:
+            self._navigation = NavigationCache.forState(state, self.action_set, self.get_static_map())
+        self._navigation.updateDoors(state)
         
         while True:
             if Phase.PLAN_PATH_TO_CLOSED_DOOR==self._phase:
-                self._navigator.reset_full()
-                closedDoors = [door for door in state.values()
-                    if 'class_inheritance' in door and 'Door' in door['class_inheritance'] and not door['is_open']]
+                closedDoors = [state.as_dict()[door_id] for door_id in sorted(self.state_index.find('Door', is_open=False))]
                 if len(closedDoors)==0:
                     return None, {}
                 # Randomly pick a closed door
-                self._door = random.choice(closedDoors)
+                self._door = closedDoors[self.rnd_gen.randint(len(closedDoors))]
                 doorLoc = self._door['location']
                 # Location in front of door is south from door
                 doorLoc = doorLoc[0],doorLoc[1]+1
                 # Send message of current action
                 self._sendMessage('Moving to door of ' + self._door['room_name'], agent_name)
-                self._navigator.add_waypoints([doorLoc])
+                self._doorFront = doorLoc
                 self._phase=Phase.FOLLOW_PATH_TO_CLOSED_DOOR
 
             if Phase.FOLLOW_PATH_TO_CLOSED_DOOR==self._phase:
-                self._state_tracker.update(state)
-                # Follow path to door
-                action = self._navigator.get_move_action(self._state_tracker)
+                # Follow path to door, stepping around team members in the way
+                location = state[self.agent_id]['location']
+                objects = state.as_dict()
+                others = [objects[member]['location'] for member in self._teamMembers if member in objects]
+                action = self._navigation.nextMove(location, self._doorFront, avoid=others)
                 if action!=None:
-                    return action, {}   
+                    return action, {}
+                if self._navigation.nextMove(location, self._doorFront)!=None:
+                    # Blocked by a team member, wait for it to move
+                    return None, {}
                 self._phase=Phase.OPEN_DOOR
 
             if Phase.OPEN_DOOR==self._phase:
@@ -78,34 +90,37 @@ class BaseLineAgent(BW4TBrain):
         Enable sending messages in one line of code
         '''
         msg = Message(content=mssg, from_id=sender)
-        if msg.content not in self.received_messages:
-            self.send_message(msg)
+        self.send_message_once(msg)
 
     def _processMessages(self, teamMembers):
         '''
-        Process incoming messages and create a dictionary with received messages from each team member.
+        Process incoming messages and create a dictionary with the messages each team member sent since the previous tick.
+        Earlier messages can be read from self.inbox.
         '''
         receivedMessages = {}
         for member in teamMembers:
-            receivedMessages[member] = []
-        for mssg in self.received_messages:
-            for member in teamMembers:
-                if mssg.from_id == member:
-                    receivedMessages[member].append(mssg.content)       
+            receivedMessages[member] = [mssg.content for mssg in self._inboxCursor.new_messages(member)]
         return receivedMessages
 
     def _trustBlief(self, member, received):
         '''
-        Baseline implementation of a trust belief. Creates a dictionary with trust belief scores for each team member, for example based on the received messages.
+        Baseline implementation of a trust belief. Updates the trust belief scores for each team member, for example based on the received messages.
+        received only holds the messages that were not processed before.
         '''
-        # You can change the default value to your preference
-        default = 0.5
-        trustBeliefs = {}
-        for member in received.keys():
-            trustBeliefs[member] = default
+        tick = self.state.as_dict()['World']['nr_ticks']
         for member in received.keys():
-            for message in received[member]:
-                if 'Found' in message and 'colour' not in message:
-                    trustBeliefs[member]-=0.1
-                    break
-        return trustBeliefs
+            self._trust.addMember(member)
+            # a member is distrusted once, on its first such message
+            if member not in self._distrusted and self._isDistrusted(received[member]):
+                self._distrusted.add(member)
+                self._trust.update(member, -0.1, tick)
+        return self._trust
+
+    def _isDistrusted(self, messages):
+        '''
+        @return true if one of the messages reports a found block without its colour
+        '''
+        for message in messages:
+            if 'Found' in message and 'colour' not in message:
+                return True
+        return False
@@ -0,0 +1,150 @@
+import os
+import pickle
+from typing import Dict, List, Tuple
+from matrx.api import api
+from matrx.grid_world import GridWorld
+
+
+class ActionRecorder:
+    '''
+    Records the actions that the agents of a GridWorld decide on, with
+    their arguments, and the messages they send, to <log base>_actions.pkl.
+    Human agents are recorded the same way, so their key presses are in it
+    as the actions they caused. Messages typed in the visualizer are
+    recorded with the messages of their agent.
+    The recording is done by wrapping the callbacks of the agent bodies
+    and the message manager on the instances, like TickProfiler does.
+    Use ActionReplay to replay a recording.
+    '''
+    def __init__(self, gridworld:GridWorld, log_file:str):
+        '''
+        @param gridworld the world to record, before it runs
+        @param log_file the name of the csv log of the world, the recording is written next to it
+        '''
+        self._gridworld = gridworld
+        self._file_name = os.path.splitext(log_file)[0] + '_actions.pkl'
+        self._file = open(self._file_name, 'wb')
+        # the agent that decided last. The GridWorld handles its messages right after its decision.
+        self._agent_id = None
+        for agent_id, body in gridworld.registered_agents.items():
+            body.get_action_func = self._recordAction(agent_id, body.get_action_func)
+        manager = gridworld.message_manager
+        preprocess = manager.preprocess_messages
+        def recordMessages(tick, messages, *args, **kwargs):
+            if len(messages) > 0:
+                self._write(('messages', tick, self._agent_id, list(messages)))
+            return preprocess(tick, messages, *args, **kwargs)
+        manager.preprocess_messages = recordMessages
+
+    def _recordAction(self, agent_id:str, get_action):
+        def recordAction(*args, **kwargs):
+            result = get_action(*args, **kwargs)
+            self._agent_id = agent_id
+            self._write(('action', self._gridworld.current_nr_ticks, agent_id, result[2], result[3]))
+            return result
+        return recordAction
+
+    def _write(self, entry:tuple):
+        if self._file is not None:
+            pickle.dump(entry, self._file, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def getFileName(self)->str:
+        '''
+        @return the name of the recording, for ActionReplay
+        '''
+        return self._file_name
+
+    def close(self):
+        '''
+        writes the rest of the recording. Called when the world stops.
+        '''
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __getstate__(self):
+        raise ValueError("worlds that record their actions can not be pickled")
+
+
+class ActionReplay:
+    '''
+    Runs a GridWorld with the actions and messages of a recording of
+    ActionRecorder instead of those of its agents, as fast as possible.
+    The brains are not asked for decisions, observations or messages while
+    replaying, but they do get the messages and action results as usual.
+    As the world itself is deterministic, the replay gives the same world
+    as the recorded run. After replaying the callbacks are restored, so the
+    world can be continued with the live brains (and visualizer). The
+    brains then rebuild their state from their next observation. Their
+    random generators are where they were at the start.
+    '''
+    def __init__(self, gridworld:GridWorld, action_file:str):
+        '''
+        @param gridworld the world to replay. It must have the same settings,
+        seed and agents as the recorded world.
+        @param action_file the file of the recording, see ActionRecorder.getFileName
+        '''
+        self._gridworld = gridworld
+        # (tick, agent id) -> (action name, action kwargs) and messages
+        self._actions:Dict[Tuple[int,str],tuple] = {}
+        self._messages:Dict[Tuple[int,str],List] = {}
+        with open(action_file, 'rb') as f:
+            while True:
+                try:
+                    entry = pickle.load(f)
+                except EOFError:
+                    break
+                if entry[0] == 'action':
+                    self._actions[(entry[1], entry[2])] = (entry[3], entry[4])
+                else:
+                    self._messages.setdefault((entry[1], entry[2]), []).extend(entry[3])
+
+    def replayUntil(self, api_info:dict, tick:int):
+        '''
+        Replays until the world has done tick ticks, or until it is done.
+        @param api_info the api info of the builder of the world
+        @param tick the number of ticks to replay
+        '''
+        gridworld = self._gridworld
+        gridworld.initialize(api_info)
+        run_api = api_info['run_matrx_api']
+        callbacks = {}
+        for agent_id, body in gridworld.registered_agents.items():
+            callbacks[agent_id] = (body.get_action_func, body.filter_observations, body.get_messages_func)
+            body.get_action_func = self._replayAction(agent_id)
+            body.filter_observations = lambda state: state
+            body.get_messages_func = self._replayMessages(agent_id)
+        # the states are only needed for the API. The state function may be wrapped already, e.g. by ParallelBrains
+        get_agent_state = gridworld.__dict__.get('_GridWorld__get_agent_state')
+        if not run_api:
+            gridworld._GridWorld__get_agent_state = lambda agent_obj: None
+        tick_duration = gridworld._GridWorld__tick_duration
+        gridworld._GridWorld__tick_duration = 0
+        api_tick_duration = api.tick_duration
+        if run_api:
+            api.tick_duration = 0
+        try:
+            is_done = gridworld._GridWorld__is_done
+            while not is_done and gridworld.current_nr_ticks < tick:
+                is_done, duration = gridworld._GridWorld__step()
+        finally:
+            for agent_id, body in gridworld.registered_agents.items():
+                body.get_action_func, body.filter_observations, body.get_messages_func = callbacks[agent_id]
+            if get_agent_state is not None:
+                gridworld._GridWorld__get_agent_state = get_agent_state
+            elif not run_api:
+                del gridworld._GridWorld__get_agent_state
+            gridworld._GridWorld__tick_duration = tick_duration
+            if run_api:
+                api.tick_duration = api_tick_duration
+
+    def _replayAction(self, agent_id:str):
+        def replayAction(state, agent_properties, agent_id=agent_id, user_input=None):
+            action, action_kwargs = self._actions.get((self._gridworld.current_nr_ticks, agent_id), (None, {}))
+            return state, agent_properties, action, action_kwargs
+        return replayAction
+
+    def _replayMessages(self, agent_id:str):
+        def replayMessages(all_agent_ids):
+            return list(self._messages.get((self._gridworld.current_nr_ticks, agent_id), []))
+        return replayMessages
@@ -1,10 +1,72 @@
 import copy
 import warnings
+from bisect import bisect_left
+from collections import OrderedDict
 import numpy as np
 from matrx.agents.agent_brain import AgentBrain
 from matrx.actions import GrabObject, RemoveObject, OpenDoorAction, CloseDoorAction
 from matrx.agents.agent_utils.state import State
 from matrx.messages import Message
+from bw4t.MessageInbox import MessageInbox
+from bw4t.StateIndex import StateIndex
+
+
+class StateChanges:
+    """ The ids of the objects that were added, removed and changed by a state update.
+    They are only looked up when they are asked for, so a brain that does
+    not use them does not pay for them. Finding the changed ids compares
+    the properties of every object that is in both states.
+    """
+    def __init__(self, previous=None, current=None):
+        """
+        Parameters
+        ----------
+        previous : dict
+            The state dict before the update, None for no changes.
+        current : dict
+            The state dict after the update, None for no changes.
+        """
+        self.__previous = {} if previous is None else previous
+        self.__current = {} if current is None else current
+        self.__added = None
+        self.__removed = None
+        self.__changed = None
+
+    @property
+    def previous(self):
+        """ The state dict before the update. Do not modify. """
+        return self.__previous
+
+    @property
+    def current(self):
+        """ The state dict after the update. Do not modify. """
+        return self.__current
+
+    @property
+    def added(self):
+        if self.__added is None:
+            self.__added = frozenset(self.__current.keys() - self.__previous.keys())
+        return self.__added
+
+    @property
+    def removed(self):
+        if self.__removed is None:
+            self.__removed = frozenset(self.__previous.keys() - self.__current.keys())
+        return self.__removed
+
+    @property
+    def changed(self):
+        if self.__changed is None:
+            previous, current = self.__previous, self.__current
+            self.__changed = frozenset(obj_id for obj_id in current.keys() & previous.keys()
+                                       if current[obj_id] != previous[obj_id])
+        return self.__changed
+
+    def __len__(self):
+        return len(self.added) + len(self.removed) + len(self.changed)
+
+    def __repr__(self):
+        return f"StateChanges(added={self.added}, removed={self.removed}, changed={self.changed})"
 
 
 class BW4TAgentBrain(AgentBrain):
@@ -13,7 +75,7 @@ class BW4TAgentBrain(AgentBrain):
     """
 
 
-    def __init__(self,memorize_for_ticks=None):
+    def __init__(self,memorize_for_ticks=None, message_retention=None, dedup_window=None):
         """ Defines the behavior of an agent.
         This class is the place where all the decision logic of an agent is
         contained. This class together with the
@@ -61,6 +123,21 @@ class BW4TAgentBrain(AgentBrain):
             performed or attempted action.
         received_messages: [Message, ...]
             The list of received messages.
+        inbox: MessageInbox
+            The received messages indexed by sender and tick. Use
+            `inbox.cursor()` to read only the messages that arrived since the
+            last read.
+        state_index: StateIndex
+            Index of the filtered state by class and property, e.g.
+            `state_index.find('Door', is_open=False)` gives the ids of the
+            closed doors without scanning the state.
+        state_changes: StateChanges
+            The ids of the objects that were added, removed or changed in
+            the state by the last state update, before filtering.
+        dedup_window: int
+            The number of ticks a message sent with `send_message_once` is
+            remembered, None to only suppress a repeat of the last message
+            sent to the same recipients.
         rnd_gen: Random
             The random generator for this agent.
         rnd_seed: int
@@ -76,6 +153,13 @@ class BW4TAgentBrain(AgentBrain):
         # appropriate agents.
         self.messages_to_send = []
         self.received_messages = []
+        # The number of ticks received messages are kept, None to keep all. Applies to received_messages and inbox.
+        self.__message_retention = message_retention
+        self.__received_ticks = []
+        self.inbox = MessageInbox(message_retention)
+        # recipients -> OrderedDict of content -> tick it was last sent, oldest first
+        self.dedup_window = dedup_window
+        self.__sent = {}
 
         # Filled by the WorldFactory during self.factory_initialise()
         self.agent_id = None
@@ -90,6 +174,8 @@ class BW4TAgentBrain(AgentBrain):
 
         # The central state property (an extended dict with unique searching capabilities)
         self._state = None
+        self.state_index = StateIndex()
+        self.state_changes = StateChanges()
 
     def initialize(self):
         """ Method called by any world when it starts.
@@ -112,6 +198,11 @@ class BW4TAgentBrain(AgentBrain):
         self.previous_action_result = None
         self.messages_to_send = []
         self.received_messages = []
+        self.__received_ticks = []
+        self.inbox = MessageInbox(self.__message_retention)
+        self.__sent = {}
+        self.state_index.clear()
+        self.state_changes = StateChanges()
         self._init_state()
 
     def filter_observations(self, state):
@@ -338,6 +429,55 @@ class BW4TAgentBrain(AgentBrain):
         # Add the message to our list
         self.messages_to_send.append(message)
 
+    def send_message_once(self, message, window=None):
+        """ Sends a Message, unless the same content was sent to the same recipients recently.
+        Without window only consecutive duplicates are not sent: the content
+        is sent again once other content was sent to the same recipients.
+        Checking for a duplicate takes constant time, so this can be used for
+        status messages that are repeated every tick without flooding the
+        other agents.
+        Parameters
+        ----------
+        message : Message
+            The message to send, as with `send_message`. Its content should be
+            hashable, otherwise it is always sent.
+        window : int
+            The number of ticks the content is remembered after it was sent.
+            Defaults to `dedup_window`, None remembers only the last content sent.
+        Returns
+        -------
+        sent : bool
+            True if the message was sent, False if it was a duplicate.
+        """
+        if window is None:
+            window = self.dedup_window
+        to_id = message.to_id
+        recipients = tuple(sorted(to_id)) if isinstance(to_id, list) else to_id
+        try:
+            hash(message.content)
+        except TypeError:
+            self.send_message(message)
+            return True
+
+        tick = 0
+        if self.state is not None and 'World' in self.state.keys():
+            tick = self.state.as_dict()['World']['nr_ticks']
+        sent = self.__sent.setdefault(recipients, OrderedDict())
+        if window is not None:
+            # forget the contents sent before the window, these are at the front
+            while len(sent) > 0:
+                content, sent_tick = next(iter(sent.items()))
+                if sent_tick > tick - window:
+                    break
+                sent.popitem(last=False)
+        if message.content in sent:
+            return False
+        if window is None:
+            sent.clear()
+        sent[message.content] = tick
+        self.send_message(message)
+        return True
+
     def is_action_possible(self, action, action_kwargs):
         """ Checks if an action would be possible.
         This method can be called from the AgentBrain to check if a certain action is possible to perform with the
@@ -456,8 +596,9 @@ class BW4TAgentBrain(AgentBrain):
         # The id of the agent
         self.agent_id = agent_id
 
-        # The names of the actions this agent is allowed to perform
-        self.action_set = action_set
+        # The names of the actions this agent is allowed to perform. MATRX collects them in a set
+        # of classes, whose order differs per process, so they are sorted to make the agents reproducible.
+        self.action_set = sorted(action_set)
 
         # Setting the random seed and rng
         self.rnd_seed = rnd_seed
@@ -512,10 +653,13 @@ class BW4TAgentBrain(AgentBrain):
         self.agent_properties = agent_properties
 
         # Update the state property of an agent with the GridWorld's state dictionary
-        self.state.state_update(state.as_dict())
+        self._update_state(state)
+        if 'World' in state.keys():
+            self._forget_messages(state['World']['nr_ticks'])
 
         # Call the filter method to filter the observation
         self.state = self.filter_observations(self.state)
+        self.state_index.update(self.state, self.state_changes)
 
         # Call the method that decides on an action
         action, action_kwargs = self.decide_on_action(self.state)
@@ -528,10 +672,26 @@ class BW4TAgentBrain(AgentBrain):
         return self.state, self.agent_properties, action, action_kwargs
 
     def _fetch_state(self, state):
-        self.state.state_update(state.as_dict())
+        self._update_state(state)
         filtered_state = self.filter_observations(self.state)
+        self.state_index.update(filtered_state, self.state_changes)
         return filtered_state
 
+    def _update_state(self, state):
+        """ Updates the state of this agent with the state from the GridWorld, and sets state_changes.
+        The State itself does the update, as in MATRX. state_changes keeps
+        the previous and the new state dict, and finds the changes in them
+        only when they are asked for.
+        Note; This method should NOT be overridden!
+        Parameters
+        ----------
+        state : State
+            The state the GridWorld made for this agent.
+        """
+        previous = self.state.as_dict()
+        self.state.state_update(state.as_dict())
+        self.state_changes = StateChanges(previous, self.state.as_dict())
+
     def _get_log_data(self):
         return self.get_log_data()
 
@@ -601,6 +761,11 @@ class BW4TAgentBrain(AgentBrain):
         # We empty all received messages as this is from the previous tick
         # self.received_messages = []
 
+        # The messages arrive at the end of the tick of the last received state
+        tick = 0
+        if self.state is not None and 'World' in self.state.keys():
+            tick = self.state.as_dict()['World']['nr_ticks']
+
         # Loop through all messages and create a Message object out of the dictionaries.
         for mssg in messages:
 
@@ -613,6 +778,24 @@ class BW4TAgentBrain(AgentBrain):
 
             # Add the message object to the received messages
             self.received_messages.append(mssg)
+            self.__received_ticks.append(tick)
+            self.inbox.add(mssg, tick)
+
+        self._forget_messages(tick)
+
+    def _forget_messages(self, tick):
+        '''
+        Forgets the received messages of all senders that are older than the retention.
+        Called every tick, also when no messages arrive.
+        @param tick the current tick
+        '''
+        if self.__message_retention is None:
+            return
+        nr = bisect_left(self.__received_ticks, tick - self.__message_retention)
+        if nr > 0:
+            del self.received_messages[:nr]
+            del self.__received_ticks[:nr]
+        self.inbox.expire(tick)
 
     def _init_state(self):
         self._state = State(memorize_for_ticks=self.memorize_for_ticks,
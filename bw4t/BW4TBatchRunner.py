@@ -0,0 +1,76 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Tuple, Optional
+from bw4t.BW4TWorld import BW4TWorld, DEFAULT_WORLDSETTINGS
+from bw4t.statistics import Statistics
+from bw4t.RunCache import RunCache
+
+# Settings that are forced for every world in a batch: no web connection,
+# no visualizer, no waiting for the start button and no sleeping between ticks.
+HEADLESS_SETTINGS:Dict[str,object]={
+    'run_matrx_api':False,
+    'run_matrx_visualizer':False,
+    'matrx_paused':False,
+    'tick_duration':0,
+}
+
+
+def _runJob(job:Tuple[int, List[dict], dict, Optional[RunCache]])->Statistics:
+    '''
+    Runs a single world of a batch. This is a module function so that
+    it can be sent to the worker processes.
+    @param job tuple (job nr, agents, worldsettings, cache or None)
+    @return the Statistics of the log of the run
+    '''
+    nr, agents, worldsettings, cache = job
+    if cache is not None:
+        return cache.run(agents, worldsettings)
+    world=BW4TWorld(agents, worldsettings).run()
+    return Statistics(world.getLogger().getFileName())
+
+
+class BW4TBatchRunner:
+    '''
+    Runs a batch of BW4T worlds headless, spread over a pool of processes.
+    Typically used to evaluate agents over many seeds.
+    Agent classes must be importable from a module (not defined in __main__
+    or inside a function) so that the worker processes can find them.
+    '''
+    def __init__(self, nr_workers:Optional[int]=None, log_path:str='.', cache:Optional[RunCache]=None):
+        '''
+        @param nr_workers the number of worker processes. None uses
+        the number of cpus. 1 runs all jobs in this process, one after another.
+        @param log_path the directory where the csv logs of all runs are written.
+        @param cache the RunCache to take the results of runs that were done
+        before from, and to add new runs to. None to run all jobs.
+        '''
+        self._nr_workers = nr_workers if nr_workers is not None else (os.cpu_count() or 1)
+        self._log_path = log_path
+        self._cache = cache
+
+    def run(self, jobs:List[Tuple[List[dict], Optional[dict], int]])->List[Statistics]:
+        '''
+        @param jobs a list of (agents, worldsettings, seed) tuples.
+        agents is a list as accepted by BW4TWorld. worldsettings may be None,
+        then DEFAULT_WORLDSETTINGS are used. seed replaces the random_seed
+        of the worldsettings. HEADLESS_SETTINGS are always applied.
+        @return list with the Statistics of each job, in the order of the jobs.
+        '''
+        work = [(nr, agents, self._settings(nr, worldsettings, seed), self._cache)
+                for nr, (agents, worldsettings, seed) in enumerate(jobs)]
+        if self._nr_workers <= 1:
+            return [_runJob(job) for job in work]
+        with ProcessPoolExecutor(max_workers=self._nr_workers) as pool:
+            return list(pool.map(_runJob, work))
+
+    def _settings(self, nr:int, worldsettings:Optional[dict], seed:int)->dict:
+        '''
+        @return copy of the worldsettings for job nr, made headless,
+        seeded and with a log file name that is unique in the batch.
+        '''
+        settings = dict(DEFAULT_WORLDSETTINGS if worldsettings is None else worldsettings)
+        settings.update(HEADLESS_SETTINGS)
+        settings['random_seed'] = seed
+        settings['log_path'] = self._log_path
+        settings['log_prefix'] = f"run{nr}_seed{seed}"
+        return settings
@@ -0,0 +1,192 @@
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+from bw4t.BW4TWorld import BW4TWorld, DEFAULT_WORLDSETTINGS
+from bw4t.BW4TBatchRunner import HEADLESS_SETTINGS
+from bw4t.statistics import Statistics
+from agents1.BW4TBaselineAgent import BaseLineAgent
+
+# The default sweep. Every combination of values is one benchmark case.
+# nr_agents is the number of BaseLineAgents, the other keys are worldsettings.
+DEFAULT_SWEEP:Dict[str,list]={
+    'nr_rooms': [9, 18],
+    'rooms_per_row': [3, 6],
+    'average_blocks_per_room': [2],
+    'nr_agents': [1, 4],
+    'deadline': [500],
+}
+
+
+def _peakRss()->Optional[int]:
+    '''
+    @return the peak resident set size of this process in kB, None if
+    that can not be measured on this platform
+    '''
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes, Linux kB
+    return rss // 1024 if sys.platform == 'darwin' else rss
+
+
+def _runCase(job)->dict:
+    '''
+    Runs one benchmark case. Runs in its own process, so that the peak
+    memory use is that of this case only.
+    @param job tuple (case, log_path) with case a dict of sweep keys and values
+    @return the measurements of the case
+    '''
+    case, log_path = job
+    settings = dict(DEFAULT_WORLDSETTINGS)
+    settings.update(HEADLESS_SETTINGS)
+    settings.update({key: value for key, value in case.items() if key != 'nr_agents'})
+    settings['log_path'] = log_path
+    settings['log_prefix'] = '_'.join(f"{key}{value}" for key, value in case.items())
+    agents = [{'name': f'agent{nr}', 'botclass': BaseLineAgent, 'settings': {}} for nr in range(case['nr_agents'])]
+
+    start = time.perf_counter()
+    world = BW4TWorld(agents, settings)
+    build_time = time.perf_counter() - start
+    start = time.perf_counter()
+    world.run()
+    run_time = time.perf_counter() - start
+
+    log_file = world.getLogger().getFileName()
+    ticks = int(Statistics(log_file).getLastTick())
+    return {'case': case, 'ticks': ticks, 'build_time': build_time, 'run_time': run_time,
+            'ticks_per_sec': ticks / run_time if run_time > 0 else float('inf'),
+            'peak_rss_kb': _peakRss(), 'log_size': os.path.getsize(log_file)}
+
+
+class BW4TBenchmark:
+    '''
+    Measures the simulation throughput of BW4T worlds with BaseLineAgents
+    for a sweep of world sizes and team sizes. Worlds run headless with
+    tick_duration 0, one after another, each in a fresh process.
+    For each case the ticks per second, the world build time, the peak
+    memory use (RSS) and the size of the log are recorded.
+    Results are saved as json and can be compared with a stored baseline
+    to catch throughput regressions.
+    '''
+    def __init__(self, sweep:Dict[str,list]=DEFAULT_SWEEP, log_path:Optional[str]=None):
+        '''
+        @param sweep dict with for each swept key the list of its values,
+        see DEFAULT_SWEEP.
+        @param log_path the directory for the csv logs of the runs, None for
+        a temporary directory.
+        '''
+        self._sweep = sweep
+        self._log_path = log_path
+
+    def cases(self)->List[dict]:
+        '''
+        @return all combinations of the sweep values. Combinations with more
+        rooms per row than rooms are skipped.
+        '''
+        keys = list(self._sweep.keys())
+        cases = [dict(zip(keys, values)) for values in itertools.product(*self._sweep.values())]
+        return [case for case in cases
+                if case.get('rooms_per_row', 0) <= case.get('nr_rooms', DEFAULT_WORLDSETTINGS['nr_rooms'])]
+
+    def run(self)->dict:
+        '''
+        @return the results: dict with 'platform', 'python', 'created' and
+        'results', a list with a dict of measurements per case
+        '''
+        if self._log_path is not None:
+            results = self._runCases(self._log_path)
+        else:
+            with tempfile.TemporaryDirectory(prefix='bw4t_benchmark') as log_path:
+                results = self._runCases(log_path)
+        return {'platform': platform.platform(), 'python': platform.python_version(),
+                'created': time.strftime('%Y-%m-%d %H:%M:%S'), 'results': results}
+
+    def _runCases(self, log_path:str)->List[dict]:
+        '''
+        @param log_path the directory for the csv logs of the runs
+        @return the measurements of all cases, each case run in a fresh process
+        '''
+        jobs = [(case, log_path) for case in self.cases()]
+        with multiprocessing.get_context().Pool(processes=1, maxtasksperchild=1) as pool:
+            return pool.map(_runCase, jobs, chunksize=1)
+
+    @staticmethod
+    def save(results:dict, filename:str):
+        with open(filename, 'w') as f:
+            json.dump(results, f, indent=1)
+
+    @staticmethod
+    def load(filename:str)->dict:
+        with open(filename) as f:
+            return json.load(f)
+
+    @staticmethod
+    def compare(results:dict, baseline:dict, tolerance:float=0.1)->List[str]:
+        '''
+        @param results results of run()
+        @param baseline earlier results of run()
+        @param tolerance the fraction that a case may be slower (or use more
+        memory) than the baseline before it is reported
+        @return list of messages, one for each regression. Cases that are
+        not in the baseline are ignored.
+        '''
+        base = {json.dumps(result['case'], sort_keys=True): result for result in baseline['results']}
+        regressions = []
+        for result in results['results']:
+            key = json.dumps(result['case'], sort_keys=True)
+            if key not in base:
+                continue
+            old = base[key]
+            if result['ticks_per_sec'] < old['ticks_per_sec'] * (1 - tolerance):
+                regressions.append(f"{key}: {result['ticks_per_sec']:.1f} ticks/sec, "
+                                   f"baseline {old['ticks_per_sec']:.1f}")
+            if result['peak_rss_kb'] is not None and old['peak_rss_kb'] is not None \
+                    and result['peak_rss_kb'] > old['peak_rss_kb'] * (1 + tolerance):
+                regressions.append(f"{key}: peak RSS {result['peak_rss_kb']} kB, "
+                                   f"baseline {old['peak_rss_kb']} kB")
+        return regressions
+
+    @staticmethod
+    def table(results:dict)->str:
+        '''
+        @return the results as readable text, one line per case
+        '''
+        lines = []
+        for result in results['results']:
+            lines.append(' '.join(f"{key}={value}" for key, value in result['case'].items()) +
+                         f": {result['ticks_per_sec']:.1f} ticks/sec, build {result['build_time']:.2f}s, "
+                         f"peak RSS {result['peak_rss_kb']} kB, log {result['log_size']} bytes")
+        return '\n'.join(lines)
+
+
+if __name__ == "__main__":
+    # use the module by its package name, so that the worker processes can find _runCase
+    from bw4t.BW4TBenchmark import BW4TBenchmark, DEFAULT_SWEEP
+    parser = argparse.ArgumentParser(description="Measure the throughput of BW4T worlds")
+    parser.add_argument('--output', default='bw4t_benchmark.json', help="json file to write the results to")
+    parser.add_argument('--baseline', help="json file with earlier results to compare with")
+    parser.add_argument('--tolerance', type=float, default=0.1, help="allowed fraction of slowdown")
+    parser.add_argument('--quick', action='store_true', help="run only the smallest case, with a short deadline")
+    args = parser.parse_args()
+
+    sweep = DEFAULT_SWEEP
+    if args.quick:
+        sweep = {key: values[:1] for key, values in DEFAULT_SWEEP.items()}
+        sweep['deadline'] = [100]
+    results = BW4TBenchmark(sweep).run()
+    BW4TBenchmark.save(results, args.output)
+    print(BW4TBenchmark.table(results))
+    if args.baseline is not None:
+        regressions = BW4TBenchmark.compare(results, BW4TBenchmark.load(args.baseline), args.tolerance)
+        for regression in regressions:
+            print("REGRESSION", regression)
+        sys.exit(1 if len(regressions) > 0 else 0)
@@ -1,6 +1,9 @@
 from abc import  ABC
+import time
+import numpy as np
 from matrx.agents.agent_utils.state import State
 from bw4t.BW4TAgentBrain import BW4TAgentBrain
+from bw4t.RoomGraphPlanner import RoomGraphPlanner
 from typing import final, List, Dict, Final, Set
 from matrx.messages import Message
 
@@ -12,7 +15,7 @@ class BW4TBrain(BW4TAgentBrain, ABC):
         
     NOT_ALLOWED_PARAMS:Final[Set[str]] ={'remove_range', 'grab_range', 'door_range', 'action_duration'}
    
-    DEFAULT_SETTINGS:Final[Dict[str,object]]={'slowdown':1, 'grab_range':1}
+    DEFAULT_SETTINGS:Final[Dict[str,object]]={'slowdown':1, 'grab_range':1, 'message_retention':None, 'dedup_window':None, 'parallel':False, 'time_budget':None, 'overrun_threshold':None}
 
     def __init__(self, settings:Dict[str,object]):
         '''
@@ -20,21 +23,129 @@ class BW4TBrain(BW4TAgentBrain, ABC):
         * slowdown : integer. Basically this sets action_duration
         field to the given slowdown. 1 implies normal speed
         of 1 action per tick. 3 givs 1 allowed action every 3 ticks. etc
+        * message_retention: integer or None. Received messages older than
+        this number of ticks are forgotten. None keeps all messages.
+        * dedup_window: integer or None. The number of ticks that a message
+        sent with send_message_once is not sent again. None to only
+        suppress a repeat of the last message sent to the same recipients.
+        * parallel: boolean. True to run this agent in its own worker process,
+        see ParallelBrains. The agent must then only use its own rnd_gen for
+        random choices to keep runs reproducible.
+        * time_budget: float or None. The maximum number of seconds that
+        decide_on_bw4t_action may take. If it takes longer, its action is
+        replaced by doing nothing (None) and this is counted as an overrun.
+        The running call is not interrupted, the budget is checked when it
+        returns. With a budget the actions depend on the speed of the
+        machine, so runs are only reproducible without one. None (default)
+        for no budget.
+        * overrun_threshold: float or None. Calls to decide_on_bw4t_action
+        that take longer than this number of seconds are only counted as
+        overruns, their action is kept.
+        Overruns are counted in get_overruns and, if time_budget or
+        overrun_threshold is set, in the log (column <agent id>_overruns).
         Implementors of BW4TBrain are NOT ALLOWED TO CHANGE THE VALUES OF NOT ALLOWED PARAMS.
         This is to ensure that agents run at the required speed.      
         Missing values get the value from DEFAULT_SETTINGS.
         '''
         self.__settings = self.DEFAULT_SETTINGS.copy()
         self.__settings.update(settings)
-        super().__init__()
+        # set by BW4TWorld when this agent is added to a world
+        self.__worldsettings = None
+        self.__static_map = None
+        # the durations (seconds) of all calls to decide_on_bw4t_action, and the number of overruns
+        self.__decision_times = []
+        self.__overruns = 0
+        super().__init__(message_retention=self.__settings['message_retention'],
+                         dedup_window=self.__settings['dedup_window'])
     
     @final
     def initialize(self):
         super().initialize()
+        self.__decision_times = []
+        self.__overruns = 0
+        if self.__static_map is not None:
+            self.state_index.setStatic(self.__static_map)
         
+    @final
+    def _set_world_settings(self, worldsettings:dict):
+        '''
+        Called by BW4TWorld when this agent is added to the world,
+        so that the agent knows the layout of the world.
+        '''
+        self.__worldsettings = worldsettings
+
+    @final
+    def _set_static_map(self, static_map:Dict[str,dict]):
+        '''
+        Called by BW4TWorld before the world starts if 'static_world_map'
+        is on, with the objects that never change.
+        '''
+        self.__static_map = static_map
+
+    @final
+    def is_parallel(self)->bool:
+        '''
+        @return true if this agent should run in a worker process
+        '''
+        return self.__settings['parallel']
+
+    @final
+    def get_decision_times(self)->np.ndarray:
+        '''
+        @return the durations in seconds of all calls to decide_on_bw4t_action
+        in the current world
+        '''
+        return np.array(self.__decision_times)
+
+    @final
+    def get_overruns(self)->int:
+        '''
+        @return number of times decide_on_bw4t_action took longer than the
+        time_budget or the overrun_threshold
+        '''
+        return self.__overruns
+
+    @final
+    def _get_log_data(self):
+        data = super()._get_log_data()
+        data = {} if data is None else dict(data)
+        if self.__settings['time_budget'] is not None or self.__settings['overrun_threshold'] is not None:
+            data['overruns'] = self.__overruns
+        return data
+
+    def get_static_map(self)->Dict[str,dict]:
+        '''
+        @return the static world map: a read-only dict with the ids of the
+        walls, area tiles, drop zones and ghost blocks as keys and their
+        properties as values. Shared between all agents, so do not modify.
+        None if the world does not have 'static_world_map' on, the state
+        then contains these objects every tick.
+        '''
+        return self.__static_map
+
+    def get_room_planner(self)->RoomGraphPlanner:
+        '''
+        @return the RoomGraphPlanner for the layout of the world this agent
+        is in. Planners are shared between agents with the same layout.
+        Only available after the agent was added to a BW4TWorld.
+        '''
+        if self.__worldsettings is None:
+            raise ValueError("The room planner is only available for agents added to a BW4TWorld")
+        return RoomGraphPlanner.forSettings(self.__worldsettings, self.action_set)
+
     @final
     def decide_on_action(self, state:State):
+        start = time.perf_counter()
         act,params = self.decide_on_bw4t_action(state)  
+        duration = time.perf_counter() - start
+        self.__decision_times.append(duration)
+        if self.__settings['time_budget'] is not None and duration > self.__settings['time_budget']:
+            # too late, the agent does nothing this time
+            self.__overruns += 1
+            act,params = None,{}
+        elif self.__settings['overrun_threshold'] is not None and duration > self.__settings['overrun_threshold']:
+            # only counted, the action is kept
+            self.__overruns += 1
         params['grab_range']=1
         # Max objects should be changed for the strong agent
         params['max_objects']=1
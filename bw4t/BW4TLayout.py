@@ -0,0 +1,51 @@
+import numpy as np
+from typing import Tuple
+
+
+class BW4TLayout:
+    '''
+    The geometry of a BW4T world: its size and where the rooms
+    and their doors are, as determined by the worldsettings.
+    This has no dependencies on MATRX so that agents and tools can use it
+    without building a world.
+    '''
+    def __init__(self, worldsettings:dict):
+        '''
+        @param worldsettings the world settings, see BW4TWorld.DEFAULT_WORLDSETTINGS
+        '''
+        self._worldsettings=worldsettings
+
+    def world_size(self)->Tuple[int,int]:
+        '''
+        returns (width,height) (number of tiles)
+        '''
+        worldsettings=self._worldsettings
+        nr_room_rows = np.ceil(worldsettings['nr_rooms'] / worldsettings['rooms_per_row'])
+
+        # calculate the total width
+        world_width = max(worldsettings['rooms_per_row'] * worldsettings['room_size'][0] + 2 * worldsettings['hallway_space'],
+                          (worldsettings['nr_drop_zones'] + 1) * worldsettings['hallway_space'] + worldsettings['nr_drop_zones']) + 2
+
+        # calculate the total height
+        world_height = nr_room_rows * worldsettings['room_size'][1] + (nr_room_rows + 1) * worldsettings['hallway_space'] + worldsettings['nr_blocks_needed'] + 2
+
+        return int(world_width), int(world_height)
+
+    def get_room_loc(self,room_nr):
+        '''
+        @return room location (room_x, room_y), (door_x, door_y) for given room nr
+        '''
+        row = np.floor(room_nr / self._worldsettings['rooms_per_row'])
+        column = room_nr % self._worldsettings['rooms_per_row']
+
+        # x is: +1 for the edge, +edge hallway, +room width * column nr, +1 off by one
+        room_x = int(1 + self._worldsettings['hallway_space'] + (self._worldsettings['room_size'][0] * column) )
+
+        # y is: +1 for the edge, +hallway space * (nr row + 1 for the top hallway), +row * room height, +1 off by one
+        room_y = int(1 + self._worldsettings['hallway_space'] * (row + 1) + row * self._worldsettings['room_size'][1] + 1)
+
+        # door location is always center bottom
+        door_x = room_x + int(np.ceil(self._worldsettings['room_size'][0] / 2))
+        door_y = room_y + self._worldsettings['room_size'][1] - 1
+
+        return (room_x, room_y), (door_x, door_y)
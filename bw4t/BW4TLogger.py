@@ -11,6 +11,23 @@ class BW4TLogger(GridWorldLogger):
     def __init__(self, save_path="", file_name_prefix="", file_extension=".csv", delimeter=";"):
         super().__init__(save_path=save_path, file_name=file_name_prefix, file_extension=file_extension,
                          delimiter=delimeter, log_strategy=1)
+        # The first tick of message_manager.preprocessed_messages not yet added to the counters.
+        self._next_tick = 0
+        # Number of messages of the global chatroom already added to the counters.
+        self._nr_global_seen = 0
+        # agent id -> number of ticks in which the agent sent at least one message (the _mssg column)
+        self._mssg_ticks = {}
+        # agent id -> total number of delivered messages (one per receiver)
+        self._total = {}
+        # agent id -> number of messages sent to everyone (to_id None), counted once per send
+        self._broadcast = {}
+        # agent id -> number of messages sent to a single agent
+        self._direct = {}
+        # private chatroom ID -> number of its messages already added to the counters
+        self._nr_private_seen = {}
+        # the most recent tick that contained messages, and per agent id the number of delivered messages in it
+        self._last_tick = -1
+        self._last_tick_count = {}
 
     def log(self, grid_world:GridWorld, agent_data):
         # So agent_data is a dictionary of shape: {<agent id>: <result from agent's get_log_data>, ...}
@@ -21,23 +38,90 @@ class BW4TLogger(GridWorldLogger):
         data['done'] = grid_world.simulation_goal.isBlocksPlaced(grid_world)
         for agent_id, agent_body in grid_world.registered_agents.items():
             data[agent_id+'_acts'] = agent_body.current_action
+            # BW4TBrain agents with a time_budget or overrun_threshold report their overruns
+            if isinstance(agent_data.get(agent_id), dict) and 'overruns' in agent_data[agent_id]:
+                data[agent_id+'_overruns'] = agent_data[agent_id]['overruns']
 
-        gwmm = grid_world.message_manager
+        self._updateMessageCounts(grid_world)
         t = grid_world.current_nr_ticks-1
-        for agent_id, agent_body in grid_world.registered_agents.items():
-            data[agent_id+'_mssg']=0
-            for i in range(0,t):
-                if i in gwmm.preprocessed_messages.keys():
-                    for mssg in gwmm.preprocessed_messages[i]:
-                        if mssg.from_id==agent_id:
-                            data[agent_id+'_mssg']+=1
-                            break
+        for agent_id in grid_world.registered_agents.keys():
+            # the _mssg column only covers the ticks before t
+            data[agent_id+'_mssg'] = self._mssg_ticks.get(agent_id, 0)
+            if self._last_tick == t and self._last_tick_count.get(agent_id, 0) > 0:
+                data[agent_id+'_mssg'] -= 1
         return data
 
+    def _updateMessageCounts(self, grid_world:GridWorld):
+        '''
+        Adds the messages of the ticks that were not counted yet to the
+        per-agent counters. Every tick of the message manager is visited
+        only once, so the cost per call only depends on the new traffic.
+        All ticks up to and including current_nr_ticks-1 are counted.
+        '''
+        gwmm = grid_world.message_manager
+        t = grid_world.current_nr_ticks-1
+        for i in range(self._next_tick, t+1):
+            if i not in gwmm.preprocessed_messages.keys():
+                continue
+            self._last_tick = i
+            self._last_tick_count = {}
+            for mssg in gwmm.preprocessed_messages[i]:
+                self._total[mssg.from_id] = self._total.get(mssg.from_id, 0) + 1
+                self._last_tick_count[mssg.from_id] = self._last_tick_count.get(mssg.from_id, 0) + 1
+            for sender in self._last_tick_count.keys():
+                self._mssg_ticks[sender] = self._mssg_ticks.get(sender, 0) + 1
+        self._next_tick = max(self._next_tick, t+1)
+
+        # the global chatroom only holds the messages sent to everyone, and is only appended to.
+        global_messages = gwmm.chatrooms[0].messages
+        for mssg in global_messages[self._nr_global_seen:]:
+            self._broadcast[mssg.from_id] = self._broadcast.get(mssg.from_id, 0) + 1
+        self._nr_global_seen = len(global_messages)
+
+        # the private chatrooms hold the messages sent to a single agent, and are only appended to.
+        for chatroom in gwmm.chatrooms:
+            if chatroom.type != 'private':
+                continue
+            seen = self._nr_private_seen.get(chatroom.ID, 0)
+            for mssg in chatroom.messages[seen:]:
+                self._direct[mssg.from_id] = self._direct.get(mssg.from_id, 0) + 1
+            self._nr_private_seen[chatroom.ID] = len(chatroom.messages)
+
+    def getMessageCounts(self)->dict:
+        '''
+        @return dict with for each agent id that sent messages a dict with keys
+        * ticks: number of ticks in which the agent sent messages (the _mssg column lags this by the latest tick)
+        * total: number of delivered messages (a broadcast counts once for every receiver)
+        * last_tick: number of delivered messages in the most recent tick with messages
+        * broadcast: number of messages sent to everyone
+        * direct: number of messages sent to a single agent (team messages are neither broadcast nor direct)
+        The counters are those of the last call to log, so no extra scans are done.
+        '''
+        counts = {}
+        for agent_id in set(self._mssg_ticks.keys()) | set(self._broadcast.keys()) | set(self._direct.keys()):
+            counts[agent_id] = {
+                'ticks': self._mssg_ticks.get(agent_id, 0),
+                'total': self._total.get(agent_id, 0),
+                'last_tick': self._last_tick_count.get(agent_id, 0),
+                'broadcast': self._broadcast.get(agent_id, 0),
+                'direct': self._direct.get(agent_id, 0)}
+        return counts
+
+    def _continueIn(self, file_name:str, contents:bytes):
+        '''
+        Makes this logger write to file_name from now on. Used for worlds
+        restored from a WorldCheckpoint, so that each gets its own log.
+        @param file_name the new log file
+        @param contents the log so far, the new log starts with it
+        '''
+        if len(contents) > 0:
+            with open(file_name, 'wb') as f:
+                f.write(contents)
+        self._GridWorldLogger__file_name = file_name
+
     # workaround for issue matrx267
     def getFileName(self):
         '''
         @return the log filename written by this logger
         '''
         return self._GridWorldLogger__file_name
-    
\ No newline at end of file
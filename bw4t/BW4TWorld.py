@@ -1,12 +1,12 @@
 import numpy as np
-import random
 import pathlib
 import os
-from typing import Final, List
+from types import MappingProxyType
+from typing import Final, List, Dict, Tuple
 from matrx.actions.move_actions import MoveEast, MoveSouth, MoveWest 
 from matrx.actions import MoveNorth, OpenDoorAction, CloseDoorAction 
 from matrx.grid_world import GridWorld, DropObject, GrabObject, AgentBody 
-from matrx import WorldBuilder 
+from matrx.objects import Door
 from matrx.world_builder import RandomProperty
 from matrx.agents import SenseCapability 
 from matrx.utils import get_room_locations
@@ -14,7 +14,15 @@ from bw4t.BW4TBlocks import CollectableBlock, GhostBlock
 from agents1.BW4THuman import Human
 from bw4t.CollectionGoal import CollectionGoal
 from bw4t.BW4TLogger import BW4TLogger
+from bw4t.BW4TLayout import BW4TLayout
 from bw4t.BW4THumanBrain import HumanBrain
+from bw4t.BW4TBrain import BW4TBrain
+from bw4t.ParallelBrains import ParallelBrains
+from bw4t.TickProfiler import TickProfiler
+from bw4t.BW4TWorldBuilder import BW4TWorldBuilder
+from bw4t.WorldTemplate import WorldTemplate
+from bw4t.TraceRecorder import TraceRecorder
+from bw4t.ActionReplay import ActionRecorder, ActionReplay
 
 DEFAULT_WORLDSETTINGS: dict={
     'deadline': 3000, # Ticks after which world terminates anyway 
@@ -24,6 +32,8 @@ DEFAULT_WORLDSETTINGS: dict={
     'matrx_paused':True,
     'run_matrx_api':True, # If you want to allow web connection
     'run_matrx_visualizer':True, # if you want to allow web visualizer
+    'log_path': '.', # directory in which the world_x folders with the csv logs are created
+    'log_prefix': '', # prefix of the csv log file names, the date and time are appended to it
 
     'key_action_map': {  # For the human agents
         'w': MoveNorth.__name__,
@@ -53,7 +63,16 @@ DEFAULT_WORLDSETTINGS: dict={
     'block_sense_range': 1,  # the range with which agents detect blocks
     'other_sense_range':  np.inf , # the range with which agents detect other objects (walls, doors, etc.)
     'agent_memory_decay': 5,  # we want to memorize states for seconds / tick_duration ticks
-    'fov_occlusion' : True # true if walls block vision. Not sure if this works at all.
+    'fov_occlusion' : True, # true if walls block vision. Not sure if this works at all.
+    'profile': False, # true to time the phases of every tick, see TickProfiler. Written next to the log.
+    'trace': False, # true to record positions, actions, carried blocks, doors and goal of every tick,
+                    # see TraceRecorder. Written next to the log.
+    'record_actions': False, # true to record the actions and messages of all agents, for replayUntil.
+                             # see ActionRecorder. Written next to the log.
+    'static_world_map': False, # true to give BW4TBrain agents the walls, areas and ghost blocks once
+                               # as a static map, instead of in their state every tick
+    'template_path': None, # directory in which the compiled layouts of worlds are cached, see WorldTemplate.
+                           # None or '' to build every world from scratch
     
 }
 
@@ -81,26 +100,33 @@ class BW4TWorld:
         self._worldsettings=worldsettings;
         self._agents=agents
         
-        np.random.seed(worldsettings['random_seed'])
+        # The room and agent colours come from their own generators, derived from the seed,
+        # so that worlds share no random state and are the same for the same seed
+        room_seed, agent_seed = np.random.SeedSequence(worldsettings['random_seed']).spawn(2)
+        self._room_rng = np.random.default_rng(room_seed)
+        self._agent_rng = np.random.default_rng(agent_seed)
+        # room name -> colour of its area tiles. Drawn here, so that rooms from a template get them too
+        self._room_colors = {f"room_{room_nr}": self._worldsettings['room_colors'][self._room_rng.integers(len(self._worldsettings['room_colors']))]
+            for room_nr in range(self._worldsettings['nr_rooms'])}
         world_size = self.world_size()
     
         # Create the goal
         goal = CollectionGoal(worldsettings['deadline'])
     
         # Create our world builder
-        self._builder = WorldBuilder(shape=world_size, tick_duration=worldsettings['tick_duration'], 
+        self._builder = BW4TWorldBuilder(shape=world_size, tick_duration=worldsettings['tick_duration'], 
            random_seed=worldsettings['random_seed'], 
            run_matrx_api=worldsettings['run_matrx_api'],
            run_matrx_visualizer=worldsettings['run_matrx_visualizer'], 
            verbose=worldsettings['verbose'], simulation_goal=goal)
         
         self._builder.api_info['_matrx_paused']=worldsettings['matrx_paused']
+        self._api_info = self._builder.api_info
     
-        # Add the world bounds (not needed, as agents cannot 'walk off' the grid, but for visual effects)
-        self._builder.add_room(top_left_location=(0, 0), width=world_size[0], height=world_size[1], name="world_bounds")
-        room_locations = self._addRooms()
-        self._addBlocks(room_locations)
-        self._addDropOffZones(world_size)
+        if not worldsettings.get('template_path'):
+            self._addLayout()
+        else:
+            self._loadTemplate()
     
         # Add the agents and human agents to the top row of the world
         self._addAgents()
@@ -108,17 +134,119 @@ class BW4TWorld:
         #media_folder = os.path.dirname(os.path.join(os.path.realpath(__file__), "media"))
         media_folder = pathlib.Path().resolve()
         self._builder.startup(media_folder=media_folder)
-        self._builder.add_logger(BW4TLogger, save_path='.')
+        self._builder.add_logger(BW4TLogger, save_path=worldsettings.get('log_path', '.'),
+            file_name_prefix=worldsettings.get('log_prefix', ''))
+
+        self._createWorld()
+
+    def _createWorld(self):
+        '''
+        Creates the next GridWorld from the builder
+        '''
+        self._gridworld = self._builder.get_world()
+        if self._worldsettings.get('static_world_map', False):
+            static_map = self._staticMap()
+            for brain in self._brains:
+                if isinstance(brain, BW4TBrain):
+                    brain._set_static_map(static_map)
+
+        # Agents that run in worker processes
+        self._parallel = None
+        parallel = [brain for brain in self._brains if isinstance(brain, BW4TBrain) and brain.is_parallel()]
+        if len(parallel) > 0:
+            self._parallel = ParallelBrains(self._gridworld, parallel)
 
-        self._gridworld = self._builder.worlds(nr_of_worlds=1).__next__()
+        self._profiler = None
+        if self._worldsettings.get('profile', False):
+            self._profiler = TickProfiler(self._gridworld, {brain.agent_id: brain for brain in self._brains
+                if not (isinstance(brain, BW4TBrain) and brain.is_parallel())})
+
+        self._trace = None
+        if self._worldsettings.get('trace', False):
+            self._trace = TraceRecorder(self.getLogger().getFileName(), self._worldsettings['deadline'] + 1)
+            self._gridworld._register_logger(self._trace)
+
+        self._recorder = None
+        if self._worldsettings.get('record_actions', False):
+            self._recorder = ActionRecorder(self._gridworld, self.getLogger().getFileName())
+
+    def nextEpisode(self):
+        '''
+        Replaces the world, after it ran, by the next world of the same
+        builder. The layout and agents stay the same, the blocks and the
+        goal blocks are drawn anew from the builder's random generator.
+        The brains are initialized again when the new world starts, and the
+        new world logs to its own file. The API and visualizer keep running.
+        '''
+        self._createWorld()
+        return self
+
+    def runEpisodes(self, nr_episodes:int)->List[str]:
+        '''
+        Runs this world and then nr_episodes-1 next worlds, see nextEpisode.
+        @param nr_episodes the number of worlds to run
+        @return the names of the log files of the episodes
+        '''
+        log_files = []
+        for episode in range(nr_episodes):
+            if episode > 0:
+                self.nextEpisode()
+            self.run()
+            log_files.append(self.getLogger().getFileName())
+        return log_files
 
     def run(self):
         '''
         run the world till termination
         '''
-        self._gridworld.run(self._builder.api_info)
+        try:
+            self._gridworld.run(self._api_info)
+        finally:
+            if self._parallel is not None:
+                self._parallel.close()
+            if self._trace is not None:
+                self._trace.close()
+            if self._recorder is not None:
+                self._recorder.close()
+        if self._profiler is not None:
+            self._profiler.write(self.getLogger().getFileName())
         return self
         
+    def runUntil(self, tick:int):
+        '''
+        Runs the world until it has done the given number of ticks, or
+        until it is done. Call run() to continue the world after this.
+        Only for worlds without API, this does not handle pausing.
+        '''
+        self._gridworld.initialize(self._api_info)
+        is_done = self._gridworld._GridWorld__is_done
+        while not is_done and self._gridworld.current_nr_ticks < tick:
+            is_done, tick_duration = self._gridworld._GridWorld__step()
+        return self
+
+    def replayUntil(self, action_file:str, tick:int):
+        '''
+        Replays the actions and messages recorded in action_file (see
+        'record_actions') as fast as possible, until the world has done the
+        given number of ticks or is done. Call run() to continue the world
+        with the live agents and visualizer after this.
+        This world must have the same settings, seed and agents as the
+        recorded world.
+        '''
+        ActionReplay(self._gridworld, action_file).replayUntil(self._api_info, tick)
+        return self
+
+    def __getstate__(self):
+        '''
+        For pickling a running world, see WorldCheckpoint. The builder is
+        left out, so a restored world can not start a next episode.
+        '''
+        if self._parallel is not None or self._profiler is not None:
+            raise ValueError("worlds with parallel agents or a profiler can not be pickled")
+        state = self.__dict__.copy()
+        state['_builder'] = None
+        return state
+
     def getLogger(self)->BW4TLogger:
         '''
         @return the logger. We assume there is only 1: BW4TLogger
@@ -126,41 +254,111 @@ class BW4TWorld:
         return self._gridworld._GridWorld__loggers[0]
         
         
+    def getProfiler(self)->TickProfiler:
+        '''
+        @return the TickProfiler of this world, None if 'profile' is off
+        '''
+        return self._profiler
+
+    def getTrace(self)->TraceRecorder:
+        '''
+        @return the TraceRecorder of this world, None if 'trace' is off
+        '''
+        return self._trace
+
+    def getActionRecorder(self)->ActionRecorder:
+        '''
+        @return the ActionRecorder of this world, None if 'record_actions' is off
+        '''
+        return self._recorder
+
+    def getDecisionReport(self, percentiles:Tuple[float,...]=(50, 90, 99, 100))->Dict[str,dict]:
+        '''
+        @param percentiles the percentiles of the decision times to report
+        @return dict with for each BW4TBrain agent name a dict with the
+        number of decisions, the number of overruns (see time_budget), the mean
+        and the given percentiles (keys 'p50' etc) of the time in seconds
+        that decide_on_bw4t_action took. Call this after run().
+        '''
+        report = {}
+        for brain in self._brains:
+            if not isinstance(brain, BW4TBrain):
+                continue
+            if self._parallel is not None and brain.is_parallel():
+                times, overruns = self._parallel.getDecisionTimes(brain.agent_id)
+            else:
+                times, overruns = brain.get_decision_times(), brain.get_overruns()
+            report[brain.agent_name] = {'decisions': len(times), 'overruns': overruns,
+                'mean': float(np.mean(times)) if len(times) > 0 else np.nan}
+            for percentile in percentiles:
+                report[brain.agent_name]['p'+str(percentile)] = \
+                    float(np.percentile(times, percentile)) if len(times) > 0 else np.nan
+        return report
+
+    def _staticMap(self)->Dict[str,dict]:
+        '''
+        @return read-only dict with the ids and properties of all objects
+        in the world that never change: everything but agents, collectable
+        blocks and doors.
+        '''
+        static_map = {}
+        for obj_id, obj in self._gridworld.environment_objects.items():
+            if not isinstance(obj, (AgentBody, CollectableBlock, Door)):
+                static_map[obj_id] = obj.properties
+        return MappingProxyType(static_map)
+
+    def _addLayout(self):
+        '''
+        Adds the walls, rooms, blocks and drop off zones
+        '''
+        world_size = self.world_size()
+        # Add the world bounds (not needed, as agents cannot 'walk off' the grid, but for visual effects)
+        self._builder.add_room(top_left_location=(0, 0), width=world_size[0], height=world_size[1], name="world_bounds")
+        room_locations = self._addRooms()
+        self._addBlocks(room_locations)
+        self._addDropOffZones(world_size)
+
+    def _loadTemplate(self):
+        '''
+        Adds the layout from the template for the worldsettings in the
+        template_path. If there is none, the layout is added, compiled and
+        stored there first. The room colours are set for this world, so
+        they are the same as without template.
+        '''
+        filename = os.path.join(self._worldsettings['template_path'],
+            WorldTemplate.key(self._worldsettings) + '.pickle')
+        if os.path.isfile(filename):
+            template = WorldTemplate.load(filename)
+        else:
+            self._addLayout()
+            template = WorldTemplate.compile(self._builder)
+            template.save(filename)
+        template.apply(self._builder, self._room_colors)
+
     def world_size(self):
         '''
         returns (width,height) (number of tiles)
         '''
-        worldsettings=self._worldsettings
-        nr_room_rows = np.ceil(worldsettings['nr_rooms'] / worldsettings['rooms_per_row'])
-    
-        # calculate the total width
-        world_width = max(worldsettings['rooms_per_row'] * worldsettings['room_size'][0] + 2 * worldsettings['hallway_space'],
-                          (worldsettings['nr_drop_zones'] + 1) * worldsettings['hallway_space'] + worldsettings['nr_drop_zones']) + 2
-    
-        # calculate the total height
-        world_height = nr_room_rows * worldsettings['room_size'][1] + (nr_room_rows + 1) * worldsettings['hallway_space'] + worldsettings['nr_blocks_needed'] + 2
-    
-        return int(world_width), int(world_height)   
+        return BW4TLayout(self._worldsettings).world_size()
     
         
     def _addBlocks(self, room_locations):
         '''
         Add blocks to all given room locations
         '''
+        # Create a MATRX random property of shape and color so each block varies per created world.
+        # These random property objects are used to obtain a certain value each time a new world is
+        # created from this builder. They allow duplicates, so one pair is sampled for all blocks
+        # in the same order as a new pair per block would be.
+        colour_property = RandomProperty(values=self._worldsettings['block_colors'])
+        shape_property = RandomProperty(values=self._worldsettings['block_shapes'])
         for room_name, locations in room_locations.items():
+            # Get the block's name
+            name = f"Block in {room_name}"
+
+            # Get the probability for adding a block so we get the on average the requested number of blocks per room
+            prob = min(1.0, self._worldsettings['average_blocks_per_room'] / len(locations))
             for loc in locations:
-                # Get the block's name
-                name = f"Block in {room_name}"
-    
-                # Get the probability for adding a block so we get the on average the requested number of blocks per room
-                prob = min(1.0, self._worldsettings['average_blocks_per_room'] / len(locations))
-    
-                # Create a MATRX random property of shape and color so each block varies per created world.
-                # These random property objects are used to obtain a certain value each time a new world is
-                # created from this builder.
-                colour_property = RandomProperty(values=self._worldsettings['block_colors'])
-                shape_property = RandomProperty(values=self._worldsettings['block_shapes'])
-    
                 # Add the block; a regular SquareBlock as denoted by the given 'callable_class' which the
                 # builder will use to create the object. In addition to setting MATRX properties, we also
                 # provide a `is_block` boolean as custom property so we can identify this as a collectible
@@ -175,15 +373,27 @@ class BW4TWorld:
         Add bots as specified, starting top left corner. 
         All bots have the same sense_capability.
         '''
-        sense_capability = SenseCapability({
-            AgentBody: self._worldsettings['agent_sense_range'],
-            CollectableBlock: self._worldsettings['block_sense_range'],
-            None: self._worldsettings['other_sense_range']})
+        if self._worldsettings.get('static_world_map', False):
+            # the static objects are in the static map, only sense the doors and what is on the own tile
+            sense_capability = SenseCapability({
+                AgentBody: self._worldsettings['agent_sense_range'],
+                CollectableBlock: self._worldsettings['block_sense_range'],
+                Door: self._worldsettings['other_sense_range'],
+                None: 0})
+        else:
+            sense_capability = SenseCapability({
+                AgentBody: self._worldsettings['agent_sense_range'],
+                CollectableBlock: self._worldsettings['block_sense_range'],
+                None: self._worldsettings['other_sense_range']})
+        self._brains = []
     
         loc = (0,1) # agents start in horizontal row at top left corner.
         team_name = "Team 1" # currently this supports 1 team 
         for agent in self._agents:
             brain = agent['botclass'](agent['settings'])
+            self._brains.append(brain)
+            if isinstance(brain, BW4TBrain):
+                brain._set_world_settings(self._worldsettings)
             loc = (loc[0] + 1, loc[1])
             if agent['botclass']==Human:
                 self._builder.add_human_agent(loc, brain,
@@ -193,7 +403,7 @@ class BW4TWorld:
             else:
                 self._builder.add_agent(loc, brain, 
                 team=team_name, name=agent['name'], 
-                sense_capability=sense_capability, visualize_shape=1, visualize_colour=self._worldsettings['block_colors'][random.randint(0,2)])
+                sense_capability=sense_capability, visualize_shape=1, visualize_colour=self._worldsettings['block_colors'][self._agent_rng.integers(len(self._worldsettings['block_colors']))])
      
     def _addRooms(self):
         '''
@@ -203,12 +413,10 @@ class BW4TWorld:
         for room_nr in range(self._worldsettings['nr_rooms']):
             room_top_left, door_loc = self.get_room_loc(room_nr)
     
-            # We assign a simple random color to each room. Not for any particular reason except to brighting up the place.
-            room_color = random.choice(self._worldsettings['room_colors'])
-                                       
-    
             # Add the room
             room_name = f"room_{room_nr}"
+            # We assign a simple random color to each room. Not for any particular reason except to brighting up the place.
+            room_color = self._room_colors[room_name]
             self._builder.add_room(top_left_location=room_top_left, 
                  width=self._worldsettings['room_size'][0], 
                  height=self._worldsettings['room_size'][1], name=room_name,
@@ -227,20 +435,7 @@ class BW4TWorld:
         '''
         @return room location (room_x, room_y), (door_x, door_y) for given room nr
         '''
-        row = np.floor(room_nr / self._worldsettings['rooms_per_row'])
-        column = room_nr % self._worldsettings['rooms_per_row']
-    
-        # x is: +1 for the edge, +edge hallway, +room width * column nr, +1 off by one
-        room_x = int(1 + self._worldsettings['hallway_space'] + (self._worldsettings['room_size'][0] * column) )
-    
-        # y is: +1 for the edge, +hallway space * (nr row + 1 for the top hallway), +row * room height, +1 off by one
-        room_y = int(1 + self._worldsettings['hallway_space'] * (row + 1) + row * self._worldsettings['room_size'][1] + 1)
-    
-        # door location is always center bottom
-        door_x = room_x + int(np.ceil(self._worldsettings['room_size'][0] / 2))
-        door_y = room_y + self._worldsettings['room_size'][1] - 1
-    
-        return (room_x, room_y), (door_x, door_y)
+        return BW4TLayout(self._worldsettings).get_room_loc(room_nr)
     
     
     def _addDropOffZones(self, world_size):
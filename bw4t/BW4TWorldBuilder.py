@@ -0,0 +1,66 @@
+from typing import Dict, List, Tuple
+from matrx import WorldBuilder
+from matrx.grid_world import GridWorld
+from matrx.objects import AreaTile, EnvObject
+
+
+class PlacementIndex:
+    '''
+    Replacement for the placement check of a GridWorld while it is being
+    built. GridWorld checks every object that is registered against all
+    objects registered before it (get_objects_in_range with range 0), which
+    makes building a world quadratic in the number of objects. Large BW4T
+    worlds have tens of thousands of walls and area tiles.
+    This keeps the intraversable objects per location instead, so each
+    check is a dict lookup. The outcome is the same as that of the check of
+    GridWorld, as objects do not move while the world is built.
+    '''
+    def __init__(self):
+        # location -> the intraversable objects (but area tiles) at that location
+        self._intraversable:Dict[Tuple[int,int],List[EnvObject]] = {}
+
+    def validate(self, env_object:EnvObject):
+        '''
+        @param env_object the object that is about to be registered.
+        @raise Exception if env_object and an object at the same location are
+        both intraversable, with the message of the GridWorld check.
+        '''
+        loc = tuple(env_object.location)
+        if AreaTile.__name__ in env_object.class_inheritance:
+            return
+        here = self._intraversable.setdefault(loc, [])
+        if not env_object.is_traversable and len(here) > 0:
+            raise Exception(f"Invalid placement. Could not place object {env_object.obj_id} in grid, location already "
+                            f"occupied by intraversable object {[obj.obj_id for obj in here]} at location "
+                            f"{env_object.location}")
+        if not env_object.is_traversable:
+            here.append(env_object)
+
+
+class BW4TWorldBuilder(WorldBuilder):
+    '''
+    WorldBuilder that creates its worlds with a PlacementIndex instead of
+    the quadratic placement check of GridWorld. Once the world is created
+    the GridWorld check is used again, e.g. for dropped objects.
+    It can also create the compiled objects of a WorldTemplate.
+    The worlds are the same as those of WorldBuilder.
+    '''
+    def _WorldBuilder__create_grid_world(self)->GridWorld:
+        world = super()._WorldBuilder__create_grid_world()
+        world._GridWorld__validate_obj_placement = PlacementIndex().validate
+        return world
+
+    def _WorldBuilder__create_world(self)->GridWorld:
+        world = super()._WorldBuilder__create_world()
+        del world._GridWorld__validate_obj_placement
+        return world
+
+    def _WorldBuilder__create_env_object(self, settings:dict):
+        if 'constructor_args' not in settings:
+            return super()._WorldBuilder__create_env_object(settings)
+        # a compiled object, see WorldTemplate. Draw from rng as WorldBuilder does.
+        if 'probability' in settings:
+            if self.rng.rand() > settings['probability']:
+                return None
+        args = self._WorldBuilder__instantiate_random_properties(settings['constructor_args'].copy())
+        return settings['callable_class'](**args)
@@ -2,7 +2,6 @@ import numpy as np # type: ignore
 
 from matrx.goals import WorldGoal # type: ignore
 from matrx.grid_world import GridWorld # type: ignore
-from matrx.objects.env_object import EnvObject # type: ignore
 
 
 class CollectionGoal(WorldGoal):
@@ -27,6 +26,12 @@ class CollectionGoal(WorldGoal):
         # We also track the progress
         self.__progress = 0
 
+        # The ids of the collectable objects seen on each drop tile at the last check, keyed by (zone nr, rank).
+        # These only change when a block is grabbed, dropped or removed on a drop tile, so if they did not change
+        # the last (is_satisfied, progress) result is still valid and the check can be skipped.
+        self.__tile_versions:dict = {}
+        self.__last_result = None
+
     #override
     def goal_reached(self, grid_world: GridWorld):
         if grid_world.current_nr_ticks >= self.max_nr_ticks:
@@ -49,6 +54,15 @@ class CollectionGoal(WorldGoal):
             for goal_blocks in self.__drop_off.values()])
         return is_satisfied
 
+    def getDeliveryTicks(self)->list:
+        '''
+        @return for every goal block, ordered by drop zone and rank, the tick
+        at which the right block was dropped on its tile, or None if it is
+        not there. Empty before the first check of the goal.
+        '''
+        return [self.__drop_off[zone_nr][rank][3] for zone_nr in sorted(self.__drop_off.keys())
+                for rank in sorted(self.__drop_off[zone_nr].keys())]
+
     def __find_drop_off_locations(self, grid_world:GridWorld):
 
         goal_blocks = {}  # dict with as key the zone nr and values list of ghostly goal blocks
@@ -89,25 +103,43 @@ class CollectionGoal(WorldGoal):
                         # Add to self.drop_off
                         self.__drop_off[zone_nr][rank] = [loc, block.visualize_shape, block.visualize_colour, None]
 
+    def __blocks_at(self, grid_world:GridWorld, loc):
+        '''
+        @return tuple of ids of the collectable objects at the given location,
+        in the order they were added to the world.
+        Uses the grid of the world so this does not loop over all objects.
+        '''
+        obj_ids = grid_world.grid[loc[1], loc[0]]
+        if obj_ids is None:
+            return ()
+        all_objs = grid_world.environment_objects
+        return tuple(obj_id for obj_id in obj_ids if obj_id in all_objs.keys()
+                     and all_objs[obj_id].properties.get("is_collectable", False))
+
     def __check_completion(self, grid_world:GridWorld):
         # Get the current tick number
         curr_tick = grid_world.current_nr_ticks
 
+        # Find the blocks on all drop tiles. If no tile changed since the last check, the result is the same.
+        tile_blocks = {}
+        for zone_nr, goal_blocks in self.__drop_off.items():
+            for rank, block_data in goal_blocks.items():
+                tile_blocks[(zone_nr, rank)] = self.__blocks_at(grid_world, block_data[0])
+        if self.__last_result is not None and tile_blocks == self.__tile_versions:
+            return self.__last_result
+        self.__tile_versions = tile_blocks
+
         # loop through all zones, check the blocks and set the tick if satisfied
+        all_objs = grid_world.environment_objects
         for zone_nr, goal_blocks in self.__drop_off.items():
             # Go through all ranks of this drop off zone
             for rank, block_data in goal_blocks.items():
-                loc = block_data[0]  # the location, needed to find blocks here
                 shape = block_data[1]  # the desired shape
                 colour = block_data[2]  # the desired colour
                 tick = block_data[3]
 
-                # Retrieve all objects, the object ids at the location and obtain all BW4T Blocks from it
-                all_objs = grid_world.environment_objects
-                obj_ids = grid_world.get_objects_in_range(loc, object_type=EnvObject, sense_range=0)
-                blocks = [all_objs[obj_id] for obj_id in obj_ids
-                          if obj_id in all_objs.keys() and "is_collectable" in all_objs[obj_id].properties.keys()]
-                blocks = [b for b in blocks if b.properties["is_collectable"]]
+                # The BW4T Blocks at the location of this rank
+                blocks = [all_objs[obj_id] for obj_id in tile_blocks[(zone_nr, rank)]]
 
                 # Check if there is a block, and if so if it is the right one and the tick is not yet set, then set the
                 # current tick.
@@ -139,4 +171,5 @@ class CollectionGoal(WorldGoal):
             # update our satisfied boolean
             is_satisfied = is_satisfied and zone_satisfied
 
+        self.__last_result = (is_satisfied, progress)
         return is_satisfied, progress
\ No newline at end of file
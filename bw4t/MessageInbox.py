@@ -0,0 +1,130 @@
+from bisect import bisect_left
+from typing import Dict, List, Optional
+from matrx.messages import Message
+
+
+class MessageInbox:
+    '''
+    The received messages of an agent, indexed by sender and tick.
+    Messages of each sender are kept in the order they were received.
+    Cursors (see cursor()) return only the messages they did not return
+    before, so reading new messages costs time proportional to the new
+    messages instead of the whole history.
+    With a retention, expire() drops the messages of all senders that are
+    older than that number of ticks.
+    '''
+    def __init__(self, retention:Optional[int]=None):
+        '''
+        @param retention the number of ticks messages are kept, or None to keep all
+        '''
+        self._retention = retention
+        # sender -> received messages and the tick of each of them
+        self._messages:Dict[str,List[Message]] = {}
+        self._ticks:Dict[str,List[int]] = {}
+        # sender -> number of messages dropped from the front of its lists, and
+        # the number of messages ever received, so that positions stay valid after dropping
+        self._dropped:Dict[str,int] = {}
+        self._received:Dict[str,int] = {}
+
+    def add(self, message:Message, tick:int):
+        '''
+        @param message a received message
+        @param tick the tick the message was received
+        '''
+        sender = message.from_id
+        if sender not in self._messages:
+            self._messages[sender] = []
+            self._ticks[sender] = []
+            self._dropped[sender] = 0
+            self._received[sender] = 0
+        self._messages[sender].append(message)
+        self._ticks[sender].append(tick)
+        self._received[sender] += 1
+
+    def expire(self, tick:int):
+        '''
+        drops the messages of all senders that are older than the retention.
+        Does nothing without retention.
+        @param tick the current tick
+        '''
+        if self._retention is None:
+            return
+        for sender in self._messages.keys():
+            self._forget(sender, tick - self._retention)
+
+    def _forget(self, sender:str, before_tick:int):
+        '''
+        drops the messages of sender received before the given tick
+        '''
+        nr = bisect_left(self._ticks[sender], before_tick)
+        if nr > 0:
+            del self._messages[sender][:nr]
+            del self._ticks[sender][:nr]
+            self._dropped[sender] += nr
+
+    def senders(self)->List[str]:
+        '''
+        @return the ids of all agents that sent messages
+        '''
+        return list(self._messages.keys())
+
+    def from_sender(self, sender:str, since_tick:int=0)->List[Message]:
+        '''
+        @return the kept messages of sender received at or after since_tick
+        '''
+        if sender not in self._messages:
+            return []
+        start = bisect_left(self._ticks[sender], since_tick)
+        return self._messages[sender][start:]
+
+    def cursor(self)->'InboxCursor':
+        '''
+        @return a new cursor, positioned at the start of the inbox
+        '''
+        return InboxCursor(self)
+
+    def clear(self):
+        '''
+        forgets all messages. Existing cursors remain valid.
+        '''
+        for sender in self._messages.keys():
+            self._dropped[sender] += len(self._messages[sender])
+            self._messages[sender] = []
+            self._ticks[sender] = []
+
+    def __len__(self):
+        return sum(len(messages) for messages in self._messages.values())
+
+
+class InboxCursor:
+    '''
+    Reads the messages of a MessageInbox that it did not read before.
+    Messages that were dropped by the retention before they were read
+    are skipped.
+    '''
+    def __init__(self, inbox:MessageInbox):
+        self._inbox = inbox
+        # sender -> number of messages of that sender read so far
+        self._read:Dict[str,int] = {}
+
+    def new_messages(self, sender:str)->List[Message]:
+        '''
+        @return the messages of sender that this cursor did not return before
+        '''
+        inbox = self._inbox
+        if sender not in inbox._messages:
+            return []
+        start = max(self._read.get(sender, 0), inbox._dropped[sender])
+        self._read[sender] = inbox._received[sender]
+        return inbox._messages[sender][start - inbox._dropped[sender]:]
+
+    def new_messages_by_sender(self)->Dict[str,List[Message]]:
+        '''
+        @return dict with for each sender with new messages the
+        messages that this cursor did not return before
+        '''
+        new = {}
+        for sender in self._inbox.senders():
+            if self._read.get(sender, 0) < self._inbox._received[sender]:
+                new[sender] = self.new_messages(sender)
+        return new
@@ -0,0 +1,191 @@
+import hashlib
+from collections import OrderedDict, deque
+from typing import Dict, List, Tuple, Optional, Iterable
+import numpy as np
+from matrx.agents.agent_utils.state import State
+from matrx.agents.agent_utils.navigator import get_move_actions
+
+
+class NavigationCache:
+    '''
+    Distance fields for navigating a BW4T world, shared by all agents
+    that see the same layout.
+    For each target location a distance field is kept: a NumPy array of
+    shape (width, height) with the number of moves from every tile to
+    the target, or -1 if the target can not be reached from that tile.
+    Fields are computed with a breadth first search the first time a target
+    is used, after which the next move towards the target is a lookup.
+    Walls are static. Doors are tracked: when a door opens or closes only
+    the fields that can change are dropped, and are recomputed on next use.
+    Other agents are not part of the fields, use the avoid parameter of
+    nextMove to step around them.
+    Only the caches of the MAX_CACHES most recently used layouts are kept
+    for new agents, so batch runs do not keep the fields of all earlier worlds.
+    '''
+    # The number of layouts whose cache is kept
+    MAX_CACHES = 4
+    # layout key -> NavigationCache, so that agents in the same world share the fields. Least recently used first.
+    _caches:'OrderedDict[str, NavigationCache]' = OrderedDict()
+
+    @staticmethod
+    def forState(state:State, action_set:List[str], static_map:Dict[str,dict]=None)->'NavigationCache':
+        '''
+        @param state the state of an agent that sees all walls and doors,
+        as with other_sense_range np.inf.
+        @param action_set the actions of the agent, the move actions in it
+        determine the possible steps.
+        @param static_map the static world map of the agent, if the world
+        has 'static_world_map' on. The walls are then taken from this map
+        and only the doors from the state.
+        @return the cache for the layout in the state. Agents with the
+        same layout, world and moves get the same cache.
+        This scans the state once, so call it once (e.g. on the first tick)
+        and keep the result.
+        '''
+        moves = get_move_actions(action_set)
+        moves.pop(None, None)
+        walls = []
+        doors = {}
+        objects = state.as_dict()
+        if static_map is not None:
+            objects = dict(static_map)
+            objects.update(state.as_dict())
+        for obj_id, obj in objects.items():
+            if obj_id == 'World' or 'class_inheritance' not in obj:
+                continue
+            if 'Door' in obj['class_inheritance']:
+                doors[obj_id] = (tuple(obj['location']), obj['is_open'])
+            elif not obj['is_traversable'] and 'AgentBody' not in obj['class_inheritance']:
+                walls.append(tuple(obj['location']))
+        shape = tuple(state['World']['grid_shape'])
+        layout = (state['World']['world_ID'], shape, tuple(sorted(walls)),
+                  tuple(sorted((door_id, loc) for door_id, (loc, is_open) in doors.items())),
+                  tuple(sorted(moves.items())))
+        key = hashlib.sha1(repr(layout).encode()).hexdigest()
+        caches = NavigationCache._caches
+        if key in caches:
+            caches.move_to_end(key)
+        else:
+            caches[key] = NavigationCache(shape, walls, doors, moves)
+            while len(caches) > NavigationCache.MAX_CACHES:
+                caches.popitem(last=False)
+        return caches[key]
+
+    def __init__(self, shape:Tuple[int,int], walls:Iterable[Tuple[int,int]],
+                 doors:Dict[str,Tuple[Tuple[int,int],bool]], moves:Dict[str,Tuple[int,int]]):
+        '''
+        @param shape (width, height) of the world
+        @param walls the locations that can never be entered
+        @param doors dict with for each door id its (location, is_open)
+        @param moves dict with move action names as keys and their (dx, dy) as values
+        '''
+        self._shape = shape
+        self._moves = moves
+        self._walls = np.zeros(shape, dtype=bool)
+        for loc in walls:
+            self._walls[loc] = True
+        self._doors = dict(doors)
+        self._fields:Dict[Tuple[int,int],np.ndarray] = {}
+
+    def updateDoors(self, state:State):
+        '''
+        Updates the door states from the state of an agent, and drops
+        the distance fields that are affected by doors that opened or closed.
+        Only the known doors are looked up, so this does not scan the state.
+        '''
+        objects = state.as_dict()
+        for door_id, (loc, was_open) in self._doors.items():
+            if door_id not in objects or objects[door_id]['is_open'] == was_open:
+                continue
+            is_open = objects[door_id]['is_open']
+            self._doors[door_id] = (loc, is_open)
+            for target in list(self._fields.keys()):
+                if self._isAffected(self._fields[target], loc, is_open):
+                    del self._fields[target]
+
+    def _isAffected(self, field:np.ndarray, loc:Tuple[int,int], is_open:bool)->bool:
+        '''
+        @return true if the field may change because the door at loc
+        opened (is_open True) or closed.
+        A closed door only matters if the field went through its tile,
+        an opened door only if one of its neighbours can reach the target.
+        '''
+        if not is_open:
+            return field[loc] >= 0
+        for dx, dy in self._moves.values():
+            x, y = loc[0] + dx, loc[1] + dy
+            if 0 <= x < self._shape[0] and 0 <= y < self._shape[1] and field[x, y] >= 0:
+                return True
+        return False
+
+    def _isBlocked(self)->np.ndarray:
+        '''
+        @return bool array of tiles that can not be entered: walls and closed doors
+        '''
+        blocked = self._walls.copy()
+        for loc, is_open in self._doors.values():
+            if not is_open:
+                blocked[loc] = True
+        return blocked
+
+    def distanceField(self, target:Tuple[int,int])->np.ndarray:
+        '''
+        @param target the (x,y) location to navigate to
+        @return array of shape (width, height) with the number of moves from
+        each tile to the target, -1 where the target can not be reached.
+        Do not modify the returned array, it is shared.
+        '''
+        target = tuple(target)
+        if target not in self._fields:
+            self._fields[target] = self._search(target)
+        return self._fields[target]
+
+    def _search(self, target:Tuple[int,int])->np.ndarray:
+        '''
+        breadth first search backwards from the target over the tiles that can be entered.
+        '''
+        blocked = self._isBlocked()
+        width, height = self._shape
+        field = np.full(self._shape, -1, dtype=np.int32)
+        field[target] = 0
+        queue = deque([target])
+        steps = list(self._moves.values())
+        while queue:
+            x, y = queue.popleft()
+            dist = field[x, y] + 1
+            for dx, dy in steps:
+                # a tile from which this move lands on (x,y)
+                px, py = x - dx, y - dy
+                if 0 <= px < width and 0 <= py < height and field[px, py] < 0 and not blocked[px, py]:
+                    field[px, py] = dist
+                    queue.append((px, py))
+        return field
+
+    def distance(self, location:Tuple[int,int], target:Tuple[int,int])->int:
+        '''
+        @return the number of moves from location to target, -1 if unreachable
+        '''
+        return int(self.distanceField(target)[tuple(location)])
+
+    def nextMove(self, location:Tuple[int,int], target:Tuple[int,int],
+                 avoid:Iterable[Tuple[int,int]]=())->Optional[str]:
+        '''
+        @param location the current (x,y) location of the agent
+        @param target the (x,y) location to go to
+        @param avoid locations that should not be entered now, e.g.
+        those of other agents.
+        @return name of a move action that brings the agent one step closer
+        to the target, or None if the agent is at the target, the target can
+        not be reached, or all such moves go to a location in avoid.
+        '''
+        field = self.distanceField(target)
+        dist = field[tuple(location)]
+        if dist <= 0:
+            return None
+        avoid = set(tuple(loc) for loc in avoid)
+        for action, (dx, dy) in self._moves.items():
+            x, y = location[0] + dx, location[1] + dy
+            if 0 <= x < self._shape[0] and 0 <= y < self._shape[1] \
+                    and field[x, y] == dist - 1 and (x, y) not in avoid:
+                return action
+        return None
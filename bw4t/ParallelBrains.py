@@ -0,0 +1,209 @@
+import multiprocessing
+import traceback
+from types import MappingProxyType
+from typing import Dict, List
+from matrx.grid_world import GridWorld
+from matrx.agents.agent_utils.state import State
+from bw4t.BW4TBrain import BW4TBrain
+
+
+def _brainState(brain:BW4TBrain)->dict:
+    '''
+    @return the attributes of brain in a form that can be sent to another
+    process: without the callback into the GridWorld and with read-only
+    dicts (such as the static map) as normal dicts.
+    '''
+    attributes = {}
+    for name, value in brain.__dict__.items():
+        if name.endswith('__callback_is_action_possible'):
+            continue
+        attributes[name] = dict(value) if isinstance(value, MappingProxyType) else value
+    return attributes
+
+
+def _notAvailable(*args, **kwargs):
+    raise RuntimeError("is_action_possible is not available for agents that run in parallel")
+
+
+def _brainWorker(conn, brain_class:type, attributes:dict, readonly:List[str]):
+    '''
+    Runs in the worker process of one agent. Rebuilds the brain and then
+    handles the commands from ParallelBrains until it gets None.
+    Every command is answered with ('ok', result) or ('error', traceback).
+    '''
+    brain = brain_class.__new__(brain_class)
+    for name in readonly:
+        attributes[name] = MappingProxyType(attributes[name])
+    brain.__dict__.update(attributes)
+    brain._BW4TAgentBrain__callback_is_action_possible = _notAvailable
+    while True:
+        command = conn.recv()
+        if command is None:
+            break
+        if command == 'times':
+            conn.send(('ok', (brain.get_decision_times(), brain.get_overruns())))
+            continue
+        try:
+            action, state, agent_properties, messages, action_result, all_agent_ids = command
+            if action_result is not None:
+                brain._set_action_result(action_result)
+            if len(messages) > 0:
+                brain._set_messages(messages)
+            if action == 'act':
+                filtered, properties, act, act_kwargs = brain._get_action(state, agent_properties, brain.agent_id)
+                result = (properties, act, act_kwargs, brain._get_messages(all_agent_ids), brain._get_log_data())
+            else:
+                brain._fetch_state(state)
+                result = brain._get_log_data()
+            conn.send(('ok', result))
+        except Exception:
+            conn.send(('error', traceback.format_exc()))
+    conn.close()
+
+
+class ParallelBrains:
+    '''
+    Runs the decisions of BW4TBrain agents in worker processes, one
+    process per agent, so that a tick takes as long as the slowest agent
+    instead of the sum of all agents.
+    In MATRX all agents decide on the states of the same tick, and the
+    actions are only performed after all agents decided. So at the start of
+    a tick the states of all parallel agents are made and sent to their
+    workers at once. The callbacks of the agent bodies are replaced, so
+    that the GridWorld collects the results in the normal agent order.
+    Messages, action results and log data are passed to and from the
+    workers, so the outcome is the same as running the agents in turn, as
+    long as the agents only use their own (seeded) random generator.
+    The brain objects in the main process are not updated after the workers
+    are started. The states shown in the visualizer are the unfiltered
+    states. Agents can not use is_action_possible.
+    With 'static_world_map' on, the states that are sent every tick are
+    much smaller.
+    '''
+    def __init__(self, gridworld:GridWorld, brains:List[BW4TBrain]):
+        '''
+        @param gridworld the world, before it runs
+        @param brains the brains to run in parallel. They must be registered
+        in gridworld, and must be picklable apart from their world callback.
+        '''
+        self._gridworld = gridworld
+        self._brains:Dict[str,BW4TBrain] = {brain.agent_id: brain for brain in brains}
+        self._workers = {}
+        # the tick of the last dispatch, and the states that were made for it
+        self._tick = -1
+        self._states:Dict[str,State] = {}
+        # agent id -> messages, action result and messages to send, buffered between ticks
+        self._messages:Dict[str,list] = {agent_id: [] for agent_id in self._brains}
+        self._action_results = {agent_id: None for agent_id in self._brains}
+        self._send:Dict[str,list] = {agent_id: [] for agent_id in self._brains}
+        self._log_data = {agent_id: {} for agent_id in self._brains}
+        # agent id -> the command the worker is working on, None if none
+        self._pending = {agent_id: None for agent_id in self._brains}
+        # agent id -> (decision times, overruns) of the worker brain, collected on close
+        self._decision_times = {}
+
+        self._get_agent_state = gridworld._GridWorld__get_agent_state
+        gridworld._GridWorld__get_agent_state = self._getAgentState
+        for agent_id, body in gridworld.registered_agents.items():
+            if agent_id in self._brains:
+                self._connect(agent_id, body)
+
+    def _connect(self, agent_id:str, body):
+        '''
+        replaces the brain callbacks of the agent body by those of this
+        '''
+        body.get_action_func = lambda state, agent_properties, agent_id: self._getAction(agent_id, state)
+        body.filter_observations = lambda state: self._observe(agent_id, state)
+        body.get_messages_func = lambda all_agent_ids: self._getMessages(agent_id)
+        body.set_messages_func = lambda messages=None: self._messages[agent_id].extend(messages or [])
+        body.set_action_result_func = lambda action_result: self._action_results.__setitem__(agent_id, action_result)
+        body.get_log_data = lambda: self._log_data[agent_id]
+
+    def _start(self):
+        '''
+        starts the workers, with the brains as they are after initialize
+        '''
+        context = multiprocessing.get_context()
+        for agent_id, brain in self._brains.items():
+            attributes = _brainState(brain)
+            readonly = [name for name, value in brain.__dict__.items() if isinstance(value, MappingProxyType)]
+            conn, child_conn = context.Pipe()
+            process = context.Process(target=_brainWorker, daemon=True,
+                                      args=(child_conn, type(brain), attributes, readonly))
+            process.start()
+            self._workers[agent_id] = (process, conn)
+            self._log_data[agent_id] = brain._get_log_data()
+
+    def _getAgentState(self, agent_obj)->State:
+        '''
+        Replaces the state function of the GridWorld. The first call in a
+        tick sends the states of all parallel agents to their workers.
+        '''
+        tick = self._gridworld.current_nr_ticks
+        if tick != self._tick:
+            self._dispatch(tick)
+        if agent_obj.obj_id in self._states:
+            return self._states.pop(agent_obj.obj_id)
+        return self._get_agent_state(agent_obj)
+
+    def _dispatch(self, tick:int):
+        if len(self._workers) == 0:
+            self._start()
+        self._tick = tick
+        all_agent_ids = list(self._gridworld.registered_agents.keys())
+        for agent_id, (process, conn) in self._workers.items():
+            body = self._gridworld.registered_agents[agent_id]
+            state = self._get_agent_state(body)
+            self._states[agent_id] = state
+            action = 'observe' if body._check_agent_busy(curr_tick=tick) else 'act'
+            conn.send((action, state, body.properties, self._messages[agent_id],
+                       self._action_results[agent_id], all_agent_ids))
+            self._pending[agent_id] = action
+            self._messages[agent_id] = []
+            self._action_results[agent_id] = None
+
+    def _receive(self, agent_id:str):
+        self._pending[agent_id] = None
+        status, result = self._workers[agent_id][1].recv()
+        if status == 'error':
+            raise RuntimeError("Agent " + agent_id + " failed in its worker process:\n" + result)
+        return result
+
+    def _getAction(self, agent_id:str, state:State):
+        properties, action, action_kwargs, messages, log_data = self._receive(agent_id)
+        self._send[agent_id] = messages
+        self._log_data[agent_id] = log_data
+        return state, properties, action, action_kwargs
+
+    def _observe(self, agent_id:str, state:State)->State:
+        # The GridWorld also filters the states before the first tick, for the
+        # API. The worker is then deciding on that state, which is used on the first tick.
+        if self._pending[agent_id] == 'observe':
+            self._log_data[agent_id] = self._receive(agent_id)
+        return state
+
+    def _getMessages(self, agent_id:str)->list:
+        messages = self._send[agent_id]
+        self._send[agent_id] = []
+        return messages
+
+    def getDecisionTimes(self, agent_id:str):
+        '''
+        @return (decision times, overruns) of the worker brain of the agent,
+        as get_decision_times and get_overruns of BW4TBrain. Only available after close.
+        '''
+        return self._decision_times[agent_id]
+
+    def close(self):
+        '''
+        stops the workers
+        '''
+        for agent_id, (process, conn) in self._workers.items():
+            if self._pending[agent_id] is not None:
+                self._receive(agent_id)
+            conn.send('times')
+            self._decision_times[agent_id] = self._receive(agent_id)
+            conn.send(None)
+            conn.close()
+            process.join()
+        self._workers = {}
@@ -0,0 +1,427 @@
+import sys
+from typing import Dict, List, Tuple, Optional
+import numpy as np
+from matrx.agents.agent_utils.navigator import get_move_actions
+from bw4t.BW4TLayout import BW4TLayout
+
+# A rectangle of tiles (x0, y0, x1, y1), bounds inclusive
+Rect = Tuple[int,int,int,int]
+
+
+class RoomGraphPlanner:
+    '''
+    Hierarchical path planner for the BW4T layout.
+    The free space of the world is split into open rectangular segments:
+    the inside of every room, the hallways between the rows of rooms, the
+    hallways left and right of the rooms and the place of the missing rooms
+    in the last row. Because segments are open rectangles, the number of
+    moves between two tiles of a segment follows from their coordinates.
+    The nodes of the graph are the doors, the tiles on the border of the
+    overlap of every two overlapping hallway segments and, with diagonal
+    moves, the pairs of tiles to step diagonally around the corners of such
+    an overlap. Shortest paths between all nodes are computed once per layout.
+    A query only combines the nodes of the start segment and the goal segment
+    with this table, so its cost does not grow with the size of the world.
+    The routes are shortest paths, see crossCheck.
+    Doors are treated as passable; agents have to open closed doors
+    themselves. Agents and other objects in the way are not considered.
+    '''
+    # (layout settings, moves) -> RoomGraphPlanner
+    _planners:Dict[tuple,'RoomGraphPlanner'] = {}
+    # the worldsettings that determine the layout
+    LAYOUT_SETTINGS:List[str] = ['room_size', 'nr_rooms', 'rooms_per_row', 'hallway_space',
+                                 'nr_drop_zones', 'nr_blocks_needed']
+
+    @staticmethod
+    def forSettings(worldsettings:dict, action_set:List[str])->'RoomGraphPlanner':
+        '''
+        @param worldsettings the settings of the world, see BW4TWorld
+        @param action_set the actions of the agent, the move actions in it
+        determine the possible steps.
+        @return the planner for the layout. Planners are shared between
+        all agents with the same layout and move actions.
+        '''
+        moves = get_move_actions(action_set)
+        moves.pop(None, None)
+        key = (tuple(str(worldsettings[name]) for name in RoomGraphPlanner.LAYOUT_SETTINGS),
+               tuple(sorted(moves.items())))
+        if key not in RoomGraphPlanner._planners:
+            RoomGraphPlanner._planners[key] = RoomGraphPlanner(BW4TLayout(worldsettings), worldsettings, moves)
+        return RoomGraphPlanner._planners[key]
+
+    def __init__(self, layout:BW4TLayout, worldsettings:dict, moves:Dict[str,Tuple[int,int]]):
+        '''
+        @param layout the layout of the world
+        @param worldsettings the settings of the world
+        @param moves dict with move action names as keys and their (dx, dy) as values
+        '''
+        self._moves = {delta:action for action, delta in moves.items()}
+        self._diagonal = any(dx != 0 and dy != 0 for dx, dy in self._moves.keys())
+        self._shape = layout.world_size()
+        # the segments, and per segment the nodes in it
+        self._segments:List[Rect] = []
+        self._segment_nodes:List[List[int]] = []
+        # the nodes, and for the door nodes their tile
+        self._nodes:List[Tuple[int,int]] = []
+        self._node_at:Dict[Tuple[int,int],int] = {}
+        self._doors:Dict[Tuple[int,int],int] = {}
+        self._edges:List[Tuple[int,int,int]] = []
+        self._build(layout, worldsettings)
+        self._index()
+        self._allPairs()
+
+    def _addNode(self, loc:Tuple[int,int])->int:
+        '''
+        @return the node at loc, which is added if there is none yet
+        '''
+        if loc not in self._node_at:
+            self._node_at[loc] = len(self._nodes)
+            self._nodes.append(loc)
+        return self._node_at[loc]
+
+    def _addSegment(self, rect:Rect)->int:
+        self._segments.append(rect)
+        self._segment_nodes.append([])
+        return len(self._segments) - 1
+
+    def _build(self, layout:BW4TLayout, worldsettings:dict):
+        '''
+        creates the segments and nodes from the layout
+        '''
+        width, height = self._shape
+        room_width, room_height = worldsettings['room_size']
+        nr_rooms = worldsettings['nr_rooms']
+        per_row = worldsettings['rooms_per_row']
+        nr_rows = int(np.ceil(nr_rooms / per_row))
+        row_y = [layout.get_room_loc(row * per_row)[0][1] for row in range(nr_rows)]
+        first_x = layout.get_room_loc(0)[0][0]
+
+        # hallways: above, between and below the rows of rooms, and left and right of the rooms
+        bands = [self._addSegment((1, 1, width - 2, row_y[0] - 1))]
+        for row in range(nr_rows):
+            bottom = row_y[row + 1] - 1 if row + 1 < nr_rows else height - 2
+            bands.append(self._addSegment((1, row_y[row] + room_height, width - 2, bottom)))
+        halls = list(bands)
+        halls.append(self._addSegment((1, 1, first_x - 1, height - 2)))
+        halls.append(self._addSegment((first_x + per_row * room_width, 1, width - 2, height - 2)))
+        # the places in the last row without a room are one open area with the hallways above, below and right of it
+        missing = nr_rows * per_row - nr_rooms
+        if missing > 0:
+            (room_x, room_y), door = layout.get_room_loc(nr_rooms)
+            above, below = self._segments[bands[nr_rows - 1]], self._segments[bands[nr_rows]]
+            halls.append(self._addSegment((room_x, above[1], width - 2, below[3])))
+
+        # rooms: the door is a node of the inside of the room and of the hallways
+        # with the tile in front of it, as it can be entered from any tile next to it.
+        # hallway node -> the tile that decides which hallways it is in
+        hall_nodes:Dict[int,Tuple[int,int]] = {}
+        for room_nr in range(nr_rooms):
+            (room_x, room_y), (door_x, door_y) = layout.get_room_loc(room_nr)
+            inside = self._addSegment((room_x + 1, room_y + 1, room_x + room_width - 2, room_y + room_height - 2))
+            door = self._addNode((door_x, door_y))
+            self._doors[(door_x, door_y)] = door
+            self._segment_nodes[inside].append(door)
+            hall_nodes[door] = (door_x, door_y + 1)
+
+        # junctions where hallways overlap
+        for i in range(len(halls)):
+            for j in range(i + 1, len(halls)):
+                a, b = self._segments[halls[i]], self._segments[halls[j]]
+                x0, y0, x1, y1 = max(a[0], b[0]), max(a[1], b[1]), min(a[2], b[2]), min(a[3], b[3])
+                if x0 > x1 or y0 > y1:
+                    continue
+                # the tiles on the border of the overlap, as every route from one hallway into
+                # the other passes one of them. Overlaps are small, hallways are at most a few tiles wide.
+                border = sorted({(x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1)
+                                 if x in (x0, x1) or y in (y0, y1)})
+                for loc in border:
+                    hall_nodes[self._addNode(loc)] = loc
+                if self._diagonal:
+                    for loc in sorted({(x0, y0), (x1, y0), (x0, y1), (x1, y1)}):
+                        self._cutCorner(loc, a, b, hall_nodes)
+        # a node in the hallways can be in more than two of them, e.g. in the place of a missing room
+        for node, (x, y) in hall_nodes.items():
+            for hall in halls:
+                x0, y0, x1, y1 = self._segments[hall]
+                if x0 <= x <= x1 and y0 <= y <= y1:
+                    self._segment_nodes[hall].append(node)
+
+        self._door_segments = {loc: [segment for segment, nodes in enumerate(self._segment_nodes) if door in nodes]
+                               for loc, door in self._doors.items()}
+
+        # all nodes in a segment can reach each other directly
+        for nodes in self._segment_nodes:
+            for i in range(len(nodes)):
+                for j in range(i + 1, len(nodes)):
+                    self._edges.append((nodes[i], nodes[j], self._segmentDistance(self._nodes[nodes[i]], self._nodes[nodes[j]])))
+
+    def _cutCorner(self, corner:Tuple[int,int], a:Rect, b:Rect, hall_nodes:Dict[int,Tuple[int,int]]):
+        '''
+        With diagonal moves a route can step diagonally around the corner
+        of the overlap of hallways a and b, from a tile that is only in a
+        to a tile that is only in b. Such pairs of tiles are added as nodes,
+        with an edge of one move.
+        '''
+        inside = lambda rect, x, y: rect[0] <= x <= rect[2] and rect[1] <= y <= rect[3]
+        steps = [(1, 0), (-1, 0), (0, 1), (0, -1)]
+        for dx1, dy1 in steps:
+            for dx2, dy2 in steps:
+                if dx1 == dx2 or dy1 == dy2:
+                    continue
+                t = (corner[0] + dx1, corner[1] + dy1)
+                u = (corner[0] + dx2, corner[1] + dy2)
+                if inside(a, *t) and not inside(b, *t) and inside(b, *u) and not inside(a, *u):
+                    t_node, u_node = self._addNode(t), self._addNode(u)
+                    hall_nodes[t_node], hall_nodes[u_node] = t, u
+                    self._edges.append((t_node, u_node, 1))
+
+    def _index(self):
+        '''
+        makes an array with for each tile the segment it is in (-1 if none),
+        and a dict with the segments of tiles that are in more than one
+        '''
+        self._segment_map = np.full(self._shape, -1, dtype=np.int32)
+        self._overlaps:Dict[Tuple[int,int],List[int]] = {}
+        for nr, (x0, y0, x1, y1) in enumerate(self._segments):
+            area = self._segment_map[x0:x1 + 1, y0:y1 + 1]
+            for x, y in zip(*np.nonzero(area >= 0)):
+                loc = (int(x) + x0, int(y) + y0)
+                self._overlaps.setdefault(loc, [int(area[x, y])]).append(nr)
+            area[area < 0] = nr
+
+    def _allPairs(self):
+        '''
+        Floyd-Warshall over the node graph. _dist holds the path lengths
+        and _next the first node on each shortest path.
+        '''
+        n = len(self._nodes)
+        self._dist = np.full((n, n), np.inf)
+        np.fill_diagonal(self._dist, 0)
+        self._next = np.tile(np.arange(n), (n, 1))
+        for a, b, dist in self._edges:
+            if dist < self._dist[a, b]:
+                self._dist[a, b] = self._dist[b, a] = dist
+        for k in range(n):
+            through = self._dist[:, k, None] + self._dist[None, k, :]
+            better = through < self._dist
+            self._dist = np.where(better, through, self._dist)
+            self._next = np.where(better, self._next[:, k, None], self._next)
+
+    def _distance(self, a:Tuple[int,int], b:Tuple[int,int])->int:
+        '''
+        @return number of moves between a and b inside one open segment
+        '''
+        dx, dy = abs(a[0] - b[0]), abs(a[1] - b[1])
+        return max(dx, dy) if self._diagonal else dx + dy
+
+    def _segmentDistance(self, a:Tuple[int,int], b:Tuple[int,int])->int:
+        '''
+        @return number of moves between a and b of the same segment, where
+        a and b can also be doors of the segment. The doors of a hallway are
+        all on the row above it, so between two doors the route has to go
+        down into the hallway and up again.
+        '''
+        dist = self._distance(a, b)
+        if a in self._doors and b in self._doors:
+            return max(dist, 2) if self._diagonal else dist + 2
+        return dist
+
+    def _segmentsOf(self, loc:Tuple[int,int])->List[int]:
+        '''
+        @return the segments at loc, or the segments of the door at loc
+        '''
+        if loc in self._doors:
+            return self._door_segments[loc]
+        return self._segmentsAt(loc)
+
+    def _segmentsAt(self, loc:Tuple[int,int])->List[int]:
+        if loc in self._overlaps:
+            return self._overlaps[loc]
+        segment = self._segment_map[loc]
+        return [int(segment)] if segment >= 0 else []
+
+    def _nodesAt(self, loc:Tuple[int,int])->Tuple[List[int],List[int]]:
+        '''
+        @return the segments at loc, and the nodes that can be reached
+        from loc in a straight line
+        '''
+        if loc in self._doors:
+            return [], [self._doors[loc]]
+        segments = self._segmentsAt(loc)
+        return segments, [node for segment in segments for node in self._segment_nodes[segment]]
+
+    def _route(self, start:Tuple[int,int], goal:Tuple[int,int])->Optional[Tuple[int,int,float]]:
+        '''
+        @return (first node, last node, length) of the shortest route from
+        start to goal through the graph, None if there is none.
+        '''
+        start_nodes = self._nodesAt(start)[1]
+        goal_nodes = self._nodesAt(goal)[1]
+        if len(start_nodes) == 0 or len(goal_nodes) == 0:
+            return None
+        to_first = np.array([self._distance(start, self._nodes[a]) for a in start_nodes])
+        from_last = np.array([self._distance(self._nodes[b], goal) for b in goal_nodes])
+        total = to_first[:, None] + self._dist[np.ix_(start_nodes, goal_nodes)] + from_last[None, :]
+        i, j = np.unravel_index(np.argmin(total), total.shape)
+        if not np.isfinite(total[i, j]):
+            return None
+        return start_nodes[i], goal_nodes[j], float(total[i, j])
+
+    def _sameSegment(self, a:Tuple[int,int], b:Tuple[int,int])->bool:
+        return len(set(self._segmentsAt(a)) & set(self._segmentsAt(b))) > 0 \
+            and a not in self._doors and b not in self._doors
+
+    def distance(self, start:Tuple[int,int], goal:Tuple[int,int])->float:
+        '''
+        @return the number of moves of the planned route, np.inf if there is none
+        '''
+        start, goal = tuple(start), tuple(goal)
+        if start == goal:
+            return 0
+        if self._sameSegment(start, goal):
+            return self._distance(start, goal)
+        route = self._route(start, goal)
+        return np.inf if route is None else route[2]
+
+    def waypoints(self, start:Tuple[int,int], goal:Tuple[int,int])->List[Tuple[int,int]]:
+        '''
+        @return the locations of the nodes on the route from start to goal,
+        followed by the goal. Between two waypoints the path is straight.
+        Empty if there is no route.
+        '''
+        start, goal = tuple(start), tuple(goal)
+        if start == goal or self._sameSegment(start, goal):
+            return [goal]
+        route = self._route(start, goal)
+        if route is None:
+            return []
+        node, last, length = route
+        path = [self._nodes[node]]
+        while node != last:
+            node = self._next[node, last]
+            path.append(self._nodes[node])
+        if path[-1] != goal:
+            path.append(goal)
+        return path
+
+    def nextMove(self, start:Tuple[int,int], goal:Tuple[int,int])->Optional[str]:
+        '''
+        @param start the current (x,y) location of the agent
+        @param goal the (x,y) location to go to
+        @return the name of the move action to do now, or None if the agent
+        is at the goal or there is no route.
+        '''
+        start, goal = tuple(start), tuple(goal)
+        if start == goal:
+            return None
+        if self._sameSegment(start, goal):
+            return self._step(start, goal)
+        route = self._route(start, goal)
+        if route is None:
+            return None
+        node, last, length = route
+        if self._nodes[node] == start:
+            if node == last:
+                return self._step(start, goal)
+            node = self._next[node, last]
+        return self._step(start, self._nodes[node])
+
+    def _step(self, start:Tuple[int,int], target:Tuple[int,int])->Optional[str]:
+        '''
+        @return a move action from start that is one move closer to target,
+        which is a neighbour or in a segment with start. The move stays inside
+        that segment, so it does not run into walls next to doors.
+        '''
+        dx, dy = target[0] - start[0], target[1] - start[1]
+        if self._distance(start, target) == 1:
+            return self._moves.get((dx, dy))
+        # the straight step first, then any other move
+        sx, sy = int(np.sign(dx)), int(np.sign(dy))
+        if not self._diagonal and sx != 0 and sy != 0:
+            if abs(dx) >= abs(dy):
+                sy = 0
+            else:
+                sx = 0
+        dist = self._segmentDistance(start, target)
+        segments = set(self._segmentsOf(start)) & set(self._segmentsOf(target))
+        for step in [(sx, sy)] + list(self._moves.keys()):
+            if step not in self._moves:
+                continue
+            loc = (start[0] + step[0], start[1] + step[1])
+            if any(segment in segments for segment in self._segmentsAt(loc)) \
+                    and self._segmentDistance(loc, target) == dist - 1:
+                return self._moves[step]
+        return None
+
+
+def _layoutWalls(layout:BW4TLayout, worldsettings:dict)->List[Tuple[int,int]]:
+    '''
+    @return the locations of the walls of the world bounds and rooms, as BW4TWorld adds them
+    '''
+    width, height = layout.world_size()
+    room_width, room_height = worldsettings['room_size']
+    walls = {(x, y) for x in range(width) for y in (0, height - 1)} | {(x, y) for x in (0, width - 1) for y in range(height)}
+    for room_nr in range(worldsettings['nr_rooms']):
+        (room_x, room_y), door = layout.get_room_loc(room_nr)
+        for x in range(room_x, room_x + room_width):
+            for y in range(room_y, room_y + room_height):
+                if (x in (room_x, room_x + room_width - 1) or y in (room_y, room_y + room_height - 1)) and (x, y) != door:
+                    walls.add((x, y))
+    return sorted(walls)
+
+
+def crossCheck(worldsettings:dict, action_set:List[str], nr_pairs:int=1000, seed:int=0)->List[tuple]:
+    '''
+    Compares the planner with the breadth first search of NavigationCache,
+    for random pairs of free tiles: the distance must be the same, and
+    following nextMove must reach the goal in that number of moves
+    without entering a wall.
+    @param worldsettings the settings of the layout to check
+    @param action_set the actions of the agent
+    @param nr_pairs the number of pairs to check
+    @param seed the seed for drawing the pairs
+    @return list of (start, goal, planner distance, BFS distance, moves walked) for every wrong pair
+    '''
+    from bw4t.NavigationCache import NavigationCache
+    layout = BW4TLayout(worldsettings)
+    moves = get_move_actions(action_set)
+    moves.pop(None, None)
+    walls = _layoutWalls(layout, worldsettings)
+    navigation = NavigationCache(layout.world_size(), walls, {}, moves)
+    planner = RoomGraphPlanner(layout, worldsettings, moves)
+    blocked = set(walls)
+    width, height = layout.world_size()
+    free = [(x, y) for x in range(width) for y in range(height) if (x, y) not in blocked]
+    wrong = []
+    for i, j in np.random.default_rng(seed).integers(len(free), size=(nr_pairs, 2)):
+        start, goal = free[i], free[j]
+        expected = navigation.distance(start, goal)
+        loc, walked = start, 0
+        while loc != goal and walked <= expected and loc not in blocked:
+            action = planner.nextMove(loc, goal)
+            if action is None:
+                break
+            loc = (loc[0] + moves[action][0], loc[1] + moves[action][1])
+            walked += 1
+        if planner.distance(start, goal) != expected or loc != goal or walked != expected:
+            wrong.append((start, goal, planner.distance(start, goal), expected, walked))
+    return wrong
+
+
+if __name__ == "__main__":
+    # Checks layouts with full and partial last rows, with and without diagonal moves
+    from bw4t.BW4TWorld import DEFAULT_WORLDSETTINGS
+    straight = ['MoveNorth', 'MoveEast', 'MoveSouth', 'MoveWest']
+    diagonal = straight + ['MoveNorthEast', 'MoveSouthEast', 'MoveSouthWest', 'MoveNorthWest']
+    failed = False
+    for nr_rooms, rooms_per_row, room_size, hallway_space in [(9, 3, (6, 4), 2), (7, 3, (6, 4), 2), (4, 3, (6, 4), 2),
+            (23, 5, (6, 4), 2), (13, 6, (6, 4), 2), (8, 3, (5, 5), 1), (11, 4, (7, 5), 3)]:
+        settings = dict(DEFAULT_WORLDSETTINGS)
+        settings.update({'nr_rooms': nr_rooms, 'rooms_per_row': rooms_per_row, 'room_size': room_size,
+                         'hallway_space': hallway_space})
+        for action_set in [straight, diagonal]:
+            wrong = crossCheck(settings, action_set)
+            print(f"nr_rooms={nr_rooms} rooms_per_row={rooms_per_row} room_size={room_size} "
+                  f"hallway_space={hallway_space} moves={len(action_set)}: {len(wrong)} wrong", wrong[:3])
+            failed = failed or len(wrong) > 0
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,181 @@
+import hashlib
+import inspect
+import json
+import os
+import pickle
+import shutil
+import tempfile
+import time
+from importlib import metadata
+from typing import List, Optional
+from bw4t.BW4TWorld import BW4TWorld
+from bw4t.statistics import Statistics
+
+# The world settings that only name the log, they do not change the run
+LOG_SETTINGS:List[str] = ['log_path', 'log_prefix']
+# Increase when the world code changes the outcome of runs, so that old entries are not used
+CACHE_VERSION = 1
+
+
+def _classSources(botclass:type)->List[str]:
+    '''
+    @return the source code of botclass and of its base classes, apart
+    from those of MATRX and Python. Classes without source (e.g. defined
+    in an interactive session) are represented by their name.
+    '''
+    sources = []
+    for cls in botclass.__mro__:
+        if cls is object or cls.__module__.split('.')[0] == 'matrx':
+            continue
+        try:
+            sources.append(inspect.getsource(cls))
+        except (OSError, TypeError):
+            sources.append(cls.__module__ + '.' + cls.__qualname__)
+    return sources
+
+
+class RunCache:
+    '''
+    A directory with the results of earlier runs, so that runs that were
+    done before (same worldsettings, agents and seed) are not simulated again.
+    Each entry holds the csv log and the Statistics of one run. On a hit
+    the log is copied to where the run would have written it.
+    Traces, profiles and action recordings are not cached.
+    Only the source of the agent classes is part of the key, not that of
+    the modules they use or of the world itself: clear the cache (or
+    increase CACHE_VERSION) when those change the outcome of runs.
+    The cache is bounded: entries that were not used for max_age seconds
+    are removed, and the least recently used entries are removed while the
+    cache is larger than max_bytes.
+    Several processes can use the same cache.
+    '''
+    def __init__(self, directory:str, max_bytes:Optional[int]=None, max_age:Optional[float]=None):
+        '''
+        @param directory the directory of the cache. It is created if needed.
+        @param max_bytes the maximum total size of the entries, None for no maximum
+        @param max_age the maximum number of seconds since an entry was last used, None for no maximum
+        '''
+        self._directory = directory
+        self._max_bytes = max_bytes
+        self._max_age = max_age
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(agents:List[dict], worldsettings:dict)->str:
+        '''
+        @param agents the agents as given to BW4TWorld
+        @param worldsettings the worldsettings as given to BW4TWorld, with the random_seed of the run
+        @return hash of the worldsettings (but the LOG_SETTINGS), of the
+        agent settings and class sources, of the MATRX version and of the CACHE_VERSION
+        '''
+        settings = {name: value for name, value in worldsettings.items() if name not in LOG_SETTINGS}
+        team = []
+        for agent in agents:
+            team.append({**{name: value for name, value in agent.items() if name != 'botclass'},
+                         'botclass': _classSources(agent['botclass'])})
+        try:
+            matrx_version = metadata.version('matrx')
+        except metadata.PackageNotFoundError:
+            matrx_version = None
+        text = json.dumps([settings, team, matrx_version, CACHE_VERSION], sort_keys=True, default=str)
+        return hashlib.sha1(text.encode()).hexdigest()
+
+    def run(self, agents:List[dict], worldsettings:dict)->Statistics:
+        '''
+        Runs the world, or gets its results from the cache.
+        @param agents the agents as given to BW4TWorld
+        @param worldsettings the worldsettings as given to BW4TWorld
+        @return the Statistics of the log of the run
+        '''
+        key = RunCache.key(agents, worldsettings)
+        statistics = self.get(key, worldsettings)
+        if statistics is None:
+            world = BW4TWorld(agents, worldsettings).run()
+            statistics = Statistics(world.getLogger().getFileName())
+            self.put(key, worldsettings, statistics)
+        return statistics
+
+    def get(self, key:str, worldsettings:dict)->Optional[Statistics]:
+        '''
+        @param key the key of the run, see key()
+        @param worldsettings the worldsettings of the run, the log is copied to its log_path
+        @return the Statistics of the log of the run, None if it is not in the cache
+        '''
+        entry = os.path.join(self._directory, key)
+        try:
+            with open(os.path.join(entry, 'entry.json')) as f:
+                info = json.load(f)
+            with open(os.path.join(entry, 'statistics.pkl'), 'rb') as f:
+                statistics:Statistics = pickle.load(f)
+            # the log gets the prefix of this run instead of that of the cached run
+            name = worldsettings.get('log_prefix', '') + info['name'][len(info['prefix']):]
+            log_file = os.path.join(worldsettings.get('log_path', '.'), info['directory'], name)
+            os.makedirs(os.path.dirname(log_file), exist_ok=True)
+            shutil.copyfile(os.path.join(entry, 'log.csv'), log_file)
+            os.utime(entry)
+        except (OSError, ValueError, pickle.UnpicklingError):
+            # not there, or removed by another process meanwhile
+            return None
+        statistics._filename = log_file
+        return statistics
+
+    def put(self, key:str, worldsettings:dict, statistics:Statistics):
+        '''
+        Adds the results of a run, then removes the entries that are too old or too many.
+        @param key the key of the run, see key()
+        @param worldsettings the worldsettings of the run
+        @param statistics the Statistics of the log of the run
+        '''
+        log_file = statistics._filename
+        tmp = tempfile.mkdtemp(dir=self._directory, suffix='.tmp')
+        shutil.copyfile(log_file, os.path.join(tmp, 'log.csv'))
+        with open(os.path.join(tmp, 'statistics.pkl'), 'wb') as f:
+            pickle.dump(statistics, f, protocol=pickle.HIGHEST_PROTOCOL)
+        relative = os.path.relpath(log_file, worldsettings.get('log_path', '.'))
+        with open(os.path.join(tmp, 'entry.json'), 'w') as f:
+            json.dump({'directory': os.path.dirname(relative), 'name': os.path.basename(relative),
+                       'prefix': worldsettings.get('log_prefix', '')}, f)
+        try:
+            os.replace(tmp, os.path.join(self._directory, key))
+        except OSError:
+            # another process stored the same run meanwhile
+            shutil.rmtree(tmp, ignore_errors=True)
+        self.evict()
+
+    def evict(self)->int:
+        '''
+        Removes the entries that were not used for max_age seconds, and then
+        the least recently used entries until the cache is not larger than max_bytes.
+        @return the number of removed entries
+        '''
+        now = time.time()
+        entries = []
+        for key in os.listdir(self._directory):
+            entry = os.path.join(self._directory, key)
+            if key.endswith('.tmp'):
+                continue
+            try:
+                used = os.stat(entry).st_mtime
+                size = sum(file.stat().st_size for file in os.scandir(entry))
+            except OSError:
+                continue
+            entries.append((used, size, entry))
+        entries.sort()
+        total = sum(size for used, size, entry in entries)
+        removed = 0
+        for used, size, entry in entries:
+            too_old = self._max_age is not None and now - used > self._max_age
+            too_big = self._max_bytes is not None and total > self._max_bytes
+            if not too_old and not too_big:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+            removed += 1
+        return removed
+
+    def clear(self):
+        '''
+        Removes all entries.
+        '''
+        for key in os.listdir(self._directory):
+            shutil.rmtree(os.path.join(self._directory, key), ignore_errors=True)
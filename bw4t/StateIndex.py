@@ -0,0 +1,178 @@
+from typing import Dict, List, Set, Iterable
+from matrx.agents.agent_utils.state import State
+
+
+class StateIndex:
+    '''
+    Index of the objects in an agent's state by class and by property value.
+    A BW4T state contains every wall tile of the world, so looking up e.g.
+    the closed doors by scanning the state takes time proportional to the
+    size of the world. This index only tracks the objects of the given
+    classes and keeps them grouped by class and by value of the given
+    properties.
+    On update, the index is changed with the ids that were added and
+    removed, as given by the StateChanges of the state update. Only the
+    tracked objects are then looked at in Python, so walls cost (almost)
+    nothing. Without StateChanges the keys of the state are compared with
+    those of the previous state; a state dict that is changed in place
+    between such updates is scanned completely.
+    Objects that are not in the per tick state, such as those of a static
+    world map, can be added once with setStatic.
+    '''
+    CLASSES:List[str] = ['Door', 'CollectableBlock', 'GhostBlock', 'AgentBody']
+    # property names. Nested properties are separated by a dot.
+    PROPERTIES:List[str] = ['is_open', 'is_collectable', 'is_movable', 'visualization.colour']
+
+    def __init__(self, classes:Iterable[str]=None, properties:Iterable[str]=None):
+        '''
+        @param classes the classes to index, default CLASSES. Objects are
+        matched on their class_inheritance.
+        @param properties the properties to index, default PROPERTIES
+        '''
+        self._classes = list(self.CLASSES if classes is None else classes)
+        self._properties = list(self.PROPERTIES if properties is None else properties)
+        self._paths = {prop: prop.split('.') for prop in self._properties}
+        self.clear()
+
+    def clear(self):
+        '''
+        forgets all objects
+        '''
+        # the objects of the last state, and the ids of the static objects
+        self._objects:Dict[str,dict] = {}
+        self._static:Set[str] = set()
+        # class name -> ids of the objects of that class
+        self._by_class:Dict[str,Set[str]] = {cls: set() for cls in self._classes}
+        # property -> value -> ids of the tracked objects with that value
+        self._by_property:Dict[str,Dict[object,Set[str]]] = {prop: {} for prop in self._properties}
+        # tracked id -> its classes and indexed property values
+        self._tracked:Dict[str,List[str]] = {}
+        self._values:Dict[str,Dict[str,object]] = {}
+
+    def update(self, state, changes=None):
+        '''
+        Brings the index up to date with the given state.
+        @param state a State or the dict of a State
+        @param changes the StateChanges of the update that made state, or
+        None. They are only used if they are the changes from the state of
+        the previous update to this state, e.g. not if the state was
+        filtered into a new dict.
+        '''
+        objects = state.as_dict() if isinstance(state, State) else state
+        if changes is not None and changes.previous is self._objects and changes.current is objects:
+            new, gone = changes.added, changes.removed
+        else:
+            if objects is self._objects:
+                # changed in place, there are no previous keys to compare with
+                new = objects.keys() - self._tracked.keys()
+            else:
+                new = objects.keys() - self._objects.keys()
+            gone = [obj_id for obj_id in self._tracked.keys() if obj_id not in objects]
+        self._objects = objects
+        for obj_id in gone:
+            if obj_id not in self._static:
+                self._untrack(obj_id)
+        self._add(objects, new)
+        for obj_id in self._tracked.keys():
+            if obj_id in objects:
+                self._setValues(obj_id, objects[obj_id])
+
+    def setStatic(self, objects:Dict[str,dict]):
+        '''
+        Adds objects that do not change and are not in the states given
+        to update, e.g. those of a static world map. They stay in the index
+        until clear() is called.
+        @param objects dict with object ids as keys and their properties as values
+        '''
+        new = objects.keys() - self._tracked.keys()
+        self._add(objects, new)
+        for obj_id in new:
+            if obj_id in self._tracked:
+                self._setValues(obj_id, objects[obj_id])
+        self._static |= objects.keys()
+
+    def _add(self, objects:Dict[str,dict], ids:Iterable[str]):
+        '''
+        starts tracking the objects with the given ids that are of an indexed class
+        '''
+        for obj_id in ids:
+            if obj_id in self._tracked or obj_id not in objects:
+                continue
+            obj = objects[obj_id]
+            if isinstance(obj, dict) and 'class_inheritance' in obj:
+                classes = [cls for cls in self._classes if cls in obj['class_inheritance']]
+                if len(classes) > 0:
+                    self._track(obj_id, classes)
+
+    def _track(self, obj_id:str, classes:List[str]):
+        self._tracked[obj_id] = classes
+        self._values[obj_id] = {}
+        for cls in classes:
+            self._by_class[cls].add(obj_id)
+
+    def _untrack(self, obj_id:str):
+        if obj_id not in self._tracked:
+            return
+        for cls in self._tracked.pop(obj_id):
+            self._by_class[cls].discard(obj_id)
+        for prop, value in self._values.pop(obj_id).items():
+            self._remove(prop, value, obj_id)
+
+    def _remove(self, prop:str, value, obj_id:str):
+        ids = self._by_property[prop][value]
+        ids.discard(obj_id)
+        if len(ids) == 0:
+            del self._by_property[prop][value]
+
+    def _setValues(self, obj_id:str, obj:dict):
+        '''
+        moves obj_id to the right value set of each property that changed
+        '''
+        values = self._values[obj_id]
+        for prop, path in self._paths.items():
+            value = obj
+            for key in path:
+                value = value.get(key) if isinstance(value, dict) else None
+            if prop in values:
+                if values[prop] == value:
+                    continue
+                self._remove(prop, values[prop], obj_id)
+            if value is None:
+                values.pop(prop, None)
+                continue
+            values[prop] = value
+            self._by_property[prop].setdefault(value, set()).add(obj_id)
+
+    def hasProperty(self, prop:str)->bool:
+        '''
+        @return true if prop is one of the indexed properties
+        '''
+        return prop in self._by_property
+
+    def ofClass(self, cls:str)->Set[str]:
+        '''
+        @param cls one of the indexed classes
+        @return the ids of the objects of that class. Do not modify.
+        '''
+        return self._by_class[cls]
+
+    def withProperty(self, prop:str, value)->Set[str]:
+        '''
+        @param prop one of the indexed properties
+        @param value the value of the property
+        @return the ids of the tracked objects that have value for prop.
+        Do not modify.
+        '''
+        return self._by_property[prop].get(value, set())
+
+    def find(self, cls:str, **properties)->Set[str]:
+        '''
+        @param cls one of the indexed classes
+        @param properties indexed properties and their required values.
+        Use __ instead of a dot for nested properties, e.g. visualization__colour='#0008ff'
+        @return the ids of the objects of class cls with all given property values
+        '''
+        result = self._by_class[cls]
+        for prop, value in properties.items():
+            result = result & self.withProperty(prop.replace('__', '.'), value)
+        return set(result)
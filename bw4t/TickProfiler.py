@@ -0,0 +1,121 @@
+import os
+import time
+from typing import Dict, List
+import numpy as np
+from matrx.grid_world import GridWorld
+
+
+class TickProfiler:
+    '''
+    Measures where the time of every tick of a GridWorld goes.
+    The phases are timed by wrapping methods of the world, its goal, its
+    loggers, the agent bodies and the brains on the instances, so nothing
+    changes for worlds that are not profiled:
+    * tick: the whole tick
+    * goal: the simulation goal's goal_reached
+    * log: the loggers, including writing the log
+    * <agent id>_state: making the state of the agent
+    * <agent id>_get_action: the agent's get_action callback, this is the
+      state update, filter_observations and decide_on_action together
+    * <agent id>_filter and <agent id>_decide: the brain's
+      filter_observations and decide_on_action
+    * <agent id>_action: performing the action of the agent
+    The rest of a tick (the API, updating the grid and the objects) is
+    the tick minus the other phases.
+    '''
+    def __init__(self, gridworld:GridWorld, brains:Dict[str,object]):
+        '''
+        @param gridworld the world to profile, before it runs
+        @param brains dict with agent ids as keys and their brains as values,
+        for which filter_observations and decide_on_action are timed.
+        Leave out brains that do not run in this process.
+        '''
+        self._gridworld = gridworld
+        agent_ids = list(gridworld.registered_agents.keys())
+        self.columns:List[str] = ['tick', 'goal', 'log'] + \
+            [agent_id + '_' + phase for agent_id in agent_ids
+             for phase in ['state', 'get_action', 'filter', 'decide', 'action']]
+        self._column = {column: nr for nr, column in enumerate(self.columns)}
+        # the row of times (seconds) of each tick
+        self._rows:List[np.ndarray] = []
+        self._current = np.zeros(len(self.columns))
+
+        self._wrap(gridworld, '_GridWorld__step', lambda *args, **kwargs: 'tick', self._endTick)
+        goals = gridworld.simulation_goal
+        for goal in goals if isinstance(goals, (list, tuple)) else [goals]:
+            self._wrap(goal, 'goal_reached', lambda *args, **kwargs: 'goal')
+        for logger in gridworld._GridWorld__loggers:
+            self._wrap(logger, '_grid_world_log', lambda *args, **kwargs: 'log')
+        self._wrap(gridworld, '_GridWorld__get_agent_state',
+                   lambda agent_obj: agent_obj.obj_id + '_state')
+        self._wrap(gridworld, '_GridWorld__perform_action',
+                   lambda agent_id, *args, **kwargs: agent_id + '_action')
+        for agent_id, body in gridworld.registered_agents.items():
+            self._wrap(body, 'get_action_func', lambda *args, agent_id=agent_id, **kwargs: agent_id + '_get_action')
+        for agent_id, brain in brains.items():
+            self._wrap(brain, 'filter_observations', lambda *args, agent_id=agent_id, **kwargs: agent_id + '_filter')
+            self._wrap(brain, 'decide_on_action', lambda *args, agent_id=agent_id, **kwargs: agent_id + '_decide')
+
+    def _wrap(self, obj, name:str, column, after=None):
+        '''
+        replaces the method name of obj by one that adds its duration to
+        the column that column(*args, **kwargs) returns, and then calls after.
+        '''
+        method = getattr(obj, name)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self._current[self._column[column(*args, **kwargs)]] += time.perf_counter() - start
+                if after is not None:
+                    after()
+        setattr(obj, name, timed)
+
+    def _endTick(self):
+        self._rows.append(self._current)
+        self._current = np.zeros(len(self.columns))
+
+    def getTimes(self)->np.ndarray:
+        '''
+        @return array of shape (number of ticks, number of columns) with the
+        seconds spent in each phase (see columns) in each tick
+        '''
+        return np.array(self._rows).reshape(len(self._rows), len(self.columns))
+
+    def getSummary(self)->Dict[str,Dict[str,float]]:
+        '''
+        @return dict with for each column a dict with the mean, p95, max and
+        total of its times in seconds over all ticks
+        '''
+        times = self.getTimes()
+        summary = {}
+        for column, nr in self._column.items():
+            values = times[:, nr]
+            if len(values) == 0:
+                summary[column] = {'mean': np.nan, 'p95': np.nan, 'max': np.nan, 'total': 0.0}
+                continue
+            summary[column] = {'mean': float(values.mean()), 'p95': float(np.percentile(values, 95)),
+                               'max': float(values.max()), 'total': float(values.sum())}
+        return summary
+
+    def write(self, log_file:str, delimiter:str=';')->List[str]:
+        '''
+        Writes the times of every tick to <log_file without .csv>_profile.csv
+        and the summary to <log_file without .csv>_profile_summary.csv
+        @param log_file the name of the csv log of the world
+        @return the names of the two written files
+        '''
+        base = os.path.splitext(log_file)[0]
+        ticks_file, summary_file = base + '_profile.csv', base + '_profile_summary.csv'
+        times = self.getTimes()
+        with open(ticks_file, 'w') as f:
+            f.write(delimiter.join(['tick_nr'] + self.columns) + '\n')
+            # the last row is the step that only checks the goal and logs
+            for tick, row in enumerate(times):
+                f.write(delimiter.join([str(tick)] + ['%.6f' % value for value in row]) + '\n')
+        with open(summary_file, 'w') as f:
+            f.write(delimiter.join(['phase', 'mean', 'p95', 'max', 'total']) + '\n')
+            for column, values in self.getSummary().items():
+                f.write(delimiter.join([column] + ['%.6f' % values[key] for key in ['mean', 'p95', 'max', 'total']]) + '\n')
+        return [ticks_file, summary_file]
@@ -0,0 +1,206 @@
+import json
+import os
+from typing import Dict, List, Optional, Union
+import numpy as np
+from matrx.grid_world import GridWorld
+from matrx.logger.logger import GridWorldLogger
+from matrx.objects import Door
+from bw4t.BW4TBlocks import CollectableBlock
+
+# The number of carried objects recorded per agent
+CARRY_SLOTS = 3
+
+
+def traceDtype(nr_agents:int, nr_doors:int, nr_goals:int, carry_slots:int=CARRY_SLOTS)->np.dtype:
+    '''
+    @return the dtype of one tick of a trace:
+    * tick: the tick number
+    * location: (x, y) of every agent
+    * action: code of the current action of every agent, -1 for none
+    * carrying: block numbers of the objects carried by every agent, -1 for an empty slot
+    * doors: 1 for every door that is open, 0 if it is closed
+    * delivered: for every goal block the tick its block was delivered, -1 if not there
+    * done: whether the goal is reached
+    '''
+    return np.dtype([('tick', '<i4'), ('location', '<i2', (nr_agents, 2)), ('action', '<i2', (nr_agents,)),
+                     ('carrying', '<i4', (nr_agents, carry_slots)), ('doors', 'u1', (nr_doors,)),
+                     ('delivered', '<i4', (nr_goals,)), ('done', '?')])
+
+
+class TraceRecorder(GridWorldLogger):
+    '''
+    Records the positions, actions and carried blocks of all agents, the
+    door states and the goal state of every tick as fixed-width NumPy
+    records, appended to a memory-mapped file <log base>_trace.bin.
+    The agents, doors, blocks and action names that the numbers in the
+    records refer to are written to <log base>_trace.json.
+    Use TraceReader to read a trace.
+    This is a logger that writes no csv: log returns nothing.
+    '''
+    def __init__(self, log_file:str, capacity:int=1000, carry_slots:int=CARRY_SLOTS):
+        '''
+        @param log_file the name of the csv log of the world, the trace
+        files are written next to it
+        @param capacity the expected number of ticks. The file grows when more are recorded.
+        @param carry_slots the number of carried objects recorded per agent
+        '''
+        super().__init__(save_path=os.path.dirname(log_file), file_name='')
+        base = os.path.splitext(log_file)[0]
+        self._trace_file = base + '_trace.bin'
+        self._info_file = base + '_trace.json'
+        self._capacity = max(1, capacity)
+        self._carry_slots = carry_slots
+        self._records = None
+        self._nr_ticks = 0
+
+    def getFileName(self)->str:
+        '''
+        @return the name of the file with the trace info, for TraceReader
+        '''
+        return self._info_file
+
+    def _start(self, grid_world:GridWorld):
+        '''
+        fixes the agents, doors, blocks and actions of the trace and creates the files
+        '''
+        objects = grid_world.environment_objects
+        self._agents = list(grid_world.registered_agents.keys())
+        self._doors = [obj_id for obj_id, obj in objects.items() if isinstance(obj, Door)]
+        self._blocks = [obj_id for obj_id, obj in objects.items() if isinstance(obj, CollectableBlock)]
+        self._block_nrs = {obj_id: nr for nr, obj_id in enumerate(self._blocks)}
+        self._actions = sorted(grid_world._GridWorld__all_actions.keys())
+        self._action_codes = {name: code for code, name in enumerate(self._actions)}
+        nr_goals = len(grid_world.simulation_goal.getDeliveryTicks())
+        self._dtype = traceDtype(len(self._agents), len(self._doors), nr_goals, self._carry_slots)
+        self._records = np.memmap(self._trace_file, dtype=self._dtype, mode='w+', shape=(self._capacity,))
+        self._info = {
+            'agents': self._agents,
+            'agent_names': [grid_world.registered_agents[agent_id].obj_name for agent_id in self._agents],
+            'doors': [[obj_id, list(objects[obj_id].location)] for obj_id in self._doors],
+            'blocks': [[obj_id, objects[obj_id].visualize_colour, objects[obj_id].visualize_shape]
+                       for obj_id in self._blocks],
+            'actions': self._actions,
+            'nr_goals': nr_goals,
+            'carry_slots': self._carry_slots,
+            'nr_ticks': 0}
+        self._writeInfo()
+
+    def _writeInfo(self):
+        self._info['nr_ticks'] = self._nr_ticks
+        with open(self._info_file, 'w') as f:
+            json.dump(self._info, f)
+
+    def _grow(self):
+        self._records.flush()
+        self._capacity *= 2
+        self._records = np.memmap(self._trace_file, dtype=self._dtype, mode='r+', shape=(self._capacity,))
+
+    def log(self, grid_world:GridWorld, agent_data):
+        if self._records is None:
+            self._start(grid_world)
+        if self._nr_ticks == self._capacity:
+            self._grow()
+        record = self._records[self._nr_ticks]
+        record['tick'] = grid_world.current_nr_ticks
+        for nr, agent_id in enumerate(self._agents):
+            body = grid_world.registered_agents[agent_id]
+            record['location'][nr] = body.location
+            record['action'][nr] = self._action_codes.get(body.current_action, -1)
+            carrying = [self._block_nrs.get(obj.obj_id, -1) for obj in body.is_carrying][:self._carry_slots]
+            record['carrying'][nr] = carrying + [-1] * (self._carry_slots - len(carrying))
+        objects = grid_world.environment_objects
+        record['doors'] = [objects[obj_id].is_open for obj_id in self._doors]
+        record['delivered'] = [-1 if tick is None else tick for tick in grid_world.simulation_goal.getDeliveryTicks()]
+        record['done'] = grid_world.simulation_goal.isBlocksPlaced(grid_world)
+        self._nr_ticks += 1
+        return {}
+
+    def _grid_world_log(self, grid_world, agent_data, last_tick=False, goal_status=None):
+        super()._grid_world_log(grid_world, agent_data, last_tick, goal_status)
+        if last_tick:
+            self.close()
+
+    def close(self):
+        '''
+        Writes the records and the number of ticks, and cuts the unused
+        capacity off the file. Called after the last tick.
+        '''
+        if self._records is None:
+            return
+        self._records.flush()
+        self._records = None
+        os.truncate(self._trace_file, self._nr_ticks * self._dtype.itemsize)
+        self._writeInfo()
+
+    def __getstate__(self):
+        raise ValueError("worlds that record a trace can not be pickled")
+
+
+class TraceReader:
+    '''
+    Reads a trace written by TraceRecorder. The records are memory-mapped,
+    so a single tick or the trajectory of a single agent can be read
+    without loading the whole run.
+    '''
+    def __init__(self, info_file:str):
+        '''
+        @param info_file the _trace.json file of the trace
+        '''
+        with open(info_file) as f:
+            self.info:dict = json.load(f)
+        self.agents:List[str] = self.info['agents']
+        self.actions:List[str] = self.info['actions']
+        dtype = traceDtype(len(self.agents), len(self.info['doors']), self.info['nr_goals'], self.info['carry_slots'])
+        trace_file = info_file[:-len('.json')] + '.bin'
+        if self.info['nr_ticks'] == 0:
+            self.records = np.zeros(0, dtype=dtype)
+        else:
+            self.records = np.memmap(trace_file, dtype=dtype, mode='r', shape=(self.info['nr_ticks'],))
+
+    def __len__(self)->int:
+        return len(self.records)
+
+    def __getitem__(self, ticks:Union[int,slice]):
+        '''
+        @param ticks the record number(s). Record i is of tick i if the
+        world was recorded from its start.
+        @return the record(s), see traceDtype
+        '''
+        return self.records[ticks]
+
+    def _agentNr(self, agent:str)->int:
+        '''
+        @param agent id or name of an agent
+        '''
+        if agent in self.agents:
+            return self.agents.index(agent)
+        return self.info['agent_names'].index(agent)
+
+    def trajectory(self, agent:str)->np.ndarray:
+        '''
+        @param agent id or name of an agent
+        @return array of shape (ticks, 2) with the locations of the agent
+        '''
+        return self.records['location'][:, self._agentNr(agent)]
+
+    def actionsOf(self, agent:str)->List[Optional[str]]:
+        '''
+        @param agent id or name of an agent
+        @return the names of the actions of the agent in every tick, None if it had none
+        '''
+        return [self.actions[code] if code >= 0 else None for code in self.records['action'][:, self._agentNr(agent)]]
+
+    def carriedBy(self, agent:str)->List[List[str]]:
+        '''
+        @param agent id or name of an agent
+        @return the ids of the blocks the agent carries in every tick
+        '''
+        blocks = self.info['blocks']
+        return [[blocks[nr][0] for nr in slots if nr >= 0] for slots in self.records['carrying'][:, self._agentNr(agent)]]
+
+    def doorStates(self)->Dict[str,np.ndarray]:
+        '''
+        @return dict with for every door id an array with in every tick true if it was open
+        '''
+        doors = self.records['doors']
+        return {obj_id: doors[:, nr].astype(bool) for nr, (obj_id, location) in enumerate(self.info['doors'])}
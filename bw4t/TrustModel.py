@@ -0,0 +1,107 @@
+from typing import Dict, Iterable, Optional
+import numpy as np
+
+
+class TrustModel:
+    '''
+    Trust scores of an agent in its team members.
+    The scores are kept in a NumPy array with one entry per member, so
+    looking up or changing a score takes constant time.
+    Scores decay towards the default value: every tick the difference with
+    the default shrinks by the decay fraction. The decay is applied lazily
+    when a score is read or updated, using the tick of its last update,
+    so idle members cost nothing.
+    '''
+    def __init__(self, default:float=0.5, decay:float=0.0, members:Iterable[str]=(),
+                 low:float=0.0, high:float=1.0):
+        '''
+        @param default the score of a member without evidence
+        @param decay the fraction of the difference with the default that
+        is lost every tick, 0 for no decay.
+        @param members the initial members
+        @param low the lowest possible score
+        @param high the highest possible score
+        '''
+        if not 0 <= decay <= 1:
+            raise ValueError("decay must be in [0,1] but got " + str(decay))
+        self._default = default
+        self._keep = 1.0 - decay
+        self._low = low
+        self._high = high
+        # member -> position in the arrays
+        self._index:Dict[str,int] = {}
+        self._scores = np.zeros(0, dtype=np.float64)
+        # the tick at which each score was last updated
+        self._ticks = np.zeros(0, dtype=np.int64)
+        for member in members:
+            self.addMember(member)
+
+    def addMember(self, member:str):
+        '''
+        adds a member with the default score, if it is not known yet
+        '''
+        if member in self._index:
+            return
+        self._index[member] = len(self._index)
+        if len(self._index) > len(self._scores):
+            # grow the arrays by doubling so that adding members is cheap
+            size = max(4, 2 * len(self._scores))
+            self._scores = np.concatenate([self._scores, np.full(size - len(self._scores), self._default)])
+            self._ticks = np.concatenate([self._ticks, np.zeros(size - len(self._ticks), dtype=np.int64)])
+
+    def members(self):
+        '''
+        @return the known members, in the order they were added
+        '''
+        return list(self._index.keys())
+
+    def _decayed(self, nr:int, tick:Optional[int])->float:
+        '''
+        @return the score at position nr, decayed to the given tick
+        '''
+        score = self._scores[nr]
+        if tick is None or self._keep == 1.0 or tick <= self._ticks[nr]:
+            return float(score)
+        return float(self._default + (score - self._default) * self._keep ** (tick - self._ticks[nr]))
+
+    def get(self, member:str, tick:Optional[int]=None)->float:
+        '''
+        @param member the member
+        @param tick the current tick, None to ignore decay
+        @return the trust score of the member, the default for unknown members
+        '''
+        if member not in self._index:
+            return self._default
+        return self._decayed(self._index[member], tick)
+
+    def update(self, member:str, change:float, tick:int=0):
+        '''
+        Changes the score of a member, after decaying it to the given tick.
+        The result is clipped to [low, high].
+        @param member the member, added if not known yet
+        @param change the amount to add to the score
+        @param tick the current tick
+        '''
+        self.addMember(member)
+        nr = self._index[member]
+        self._scores[nr] = min(self._high, max(self._low, self._decayed(nr, tick) + change))
+        self._ticks[nr] = max(tick, self._ticks[nr])
+
+    def set(self, member:str, score:float, tick:int=0):
+        '''
+        Sets the score of a member at the given tick
+        '''
+        self.addMember(member)
+        nr = self._index[member]
+        self._scores[nr] = min(self._high, max(self._low, score))
+        self._ticks[nr] = tick
+
+    def scores(self, tick:Optional[int]=None)->Dict[str,float]:
+        '''
+        @param tick the current tick, None to ignore decay
+        @return dict with the score of every member
+        '''
+        return {member: self._decayed(nr, tick) for member, nr in self._index.items()}
+
+    def __str__(self):
+        return str(self.scores())
@@ -0,0 +1,138 @@
+import copyreg
+import io
+import os
+import pickle
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from types import MappingProxyType, MethodType
+from typing import Callable, List, Optional
+from bw4t.BW4TWorld import BW4TWorld
+from bw4t.statistics import Statistics
+
+
+def _mappingProxy(values:dict)->MappingProxyType:
+    return MappingProxyType(values)
+
+
+def _reduceMappingProxy(proxy:MappingProxyType):
+    # read-only dicts, such as the static world map, are pickled as a copy of their dict
+    return _mappingProxy, (dict(proxy),)
+
+
+def _reduceMethod(method:MethodType):
+    # pickle looks bound methods up by their name, which does not work for
+    # private methods such as the callbacks into the GridWorld: use the mangled name
+    name = method.__func__.__name__
+    if name.startswith('__') and not name.endswith('__'):
+        name = '_' + method.__func__.__qualname__.split('.')[-2].lstrip('_') + name
+    return getattr, (method.__self__, name)
+
+
+def _reduceKeys(keys):
+    # MATRX chatrooms keep a view of the keys of the registered agents.
+    # The agents of a BW4T world do not change, so a list does the same.
+    return list, (list(keys),)
+
+
+def _runFork(job)->Statistics:
+    '''
+    Runs one continuation of a checkpoint. This is a module function so
+    that it can be sent to the worker processes.
+    @param job tuple (checkpoint, name, continuation)
+    @return the Statistics of the log of the continuation
+    '''
+    checkpoint, name, continuation = job
+    world = checkpoint.restore(name)
+    if continuation is not None:
+        continuation(world)
+    world.run()
+    return Statistics(world.getLogger().getFileName())
+
+
+class WorldCheckpoint:
+    '''
+    Snapshot of a running BW4TWorld: the GridWorld with all objects, doors,
+    carried blocks, the goal with its drop off records, the messages, and
+    the brains with their state and random generators. The log so far is
+    kept as well.
+    A checkpoint can be restored any number of times, each time as an
+    independent world that continues from the tick of the snapshot. This is
+    much cheaper than running the ticks before it again. Continuing a
+    restored world gives the same run as continuing the original world, as
+    long as the agents only use their own random generator.
+    Only worlds without API and without parallel agents or profiler can be
+    checkpointed. Restored worlds can not start a next episode.
+    '''
+    def __init__(self, world:bytes, log:bytes, tick:int):
+        '''
+        Use take to make a checkpoint.
+        @param world the pickled BW4TWorld
+        @param log the contents of the log file at the snapshot
+        @param tick the number of ticks done at the snapshot
+        '''
+        self._world = world
+        self._log = log
+        self.tick = tick
+
+    @staticmethod
+    def take(world:BW4TWorld)->'WorldCheckpoint':
+        '''
+        @param world a world that is not running, typically after runUntil
+        @return snapshot of world
+        '''
+        if world._api_info['run_matrx_api']:
+            raise ValueError("worlds that run the MATRX api can not be checkpointed")
+        buffer = io.BytesIO()
+        pickler = pickle.Pickler(buffer, protocol=pickle.HIGHEST_PROTOCOL)
+        pickler.dispatch_table = copyreg.dispatch_table.copy()
+        pickler.dispatch_table[MappingProxyType] = _reduceMappingProxy
+        pickler.dispatch_table[type(OrderedDict().keys())] = _reduceKeys
+        pickler.dispatch_table[MethodType] = _reduceMethod
+        pickler.dump(world)
+        log_file = world.getLogger().getFileName()
+        log = b''
+        if os.path.isfile(log_file):
+            with open(log_file, 'rb') as f:
+                log = f.read()
+        return WorldCheckpoint(buffer.getvalue(), log, world._gridworld.current_nr_ticks)
+
+    def restore(self, name:str='restored')->BW4TWorld:
+        '''
+        @param name added to the name of the original log file to make the
+        log file of the restored world. The log starts with the log so far.
+        @return a new world in the state of the snapshot. Call run() to continue it.
+        '''
+        world = pickle.loads(self._world)
+        logger = world.getLogger()
+        logger._continueIn(os.path.splitext(logger.getFileName())[0] + '_' + name + '.csv', self._log)
+        return world
+
+    def fork(self, continuations:List[Optional[Callable[[BW4TWorld], None]]],
+             nr_workers:Optional[int]=None)->List[Statistics]:
+        '''
+        Runs several continuations of this checkpoint until their worlds are
+        done, spread over a pool of processes.
+        @param continuations for each continuation a function that is called
+        with the restored world before it runs, e.g. to change the settings
+        of an agent, or None to run the world as it is. The functions must be
+        importable from a module, like the agent classes in BW4TBatchRunner.
+        @param nr_workers the number of worker processes. None uses the
+        number of cpus. 1 runs all continuations in this process.
+        @return list with the Statistics of each continuation, in order. The
+        log of continuation i ends with _fork<i>.csv
+        '''
+        nr_workers = nr_workers if nr_workers is not None else (os.cpu_count() or 1)
+        jobs = [(self, 'fork' + str(nr), continuation) for nr, continuation in enumerate(continuations)]
+        if nr_workers <= 1:
+            return [_runFork(job) for job in jobs]
+        with ProcessPoolExecutor(max_workers=nr_workers) as pool:
+            return list(pool.map(_runFork, jobs))
+
+    def save(self, filename:str):
+        with open(filename, 'wb') as f:
+            pickle.dump((self._world, self._log, self.tick), f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def load(filename:str)->'WorldCheckpoint':
+        with open(filename, 'rb') as f:
+            return WorldCheckpoint(*pickle.load(f))
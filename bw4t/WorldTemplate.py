@@ -0,0 +1,196 @@
+import hashlib
+import inspect
+import json
+import os
+import pickle
+import tempfile
+import warnings
+from collections import OrderedDict
+from importlib import metadata
+from typing import Dict, List
+from matrx import WorldBuilder
+from matrx.objects import EnvObject, AreaTile
+
+# The world settings that determine the objects of a world (apart from the agents)
+LAYOUT_SETTINGS:List[str] = ['room_size', 'nr_rooms', 'rooms_per_row', 'average_blocks_per_room',
+    'block_shapes', 'block_colors', 'room_colors', 'wall_color', 'drop_off_color', 'block_size',
+    'nr_drop_zones', 'nr_blocks_needed', 'hallway_space']
+# Increase when the contents of templates change, so that old files are not used
+TEMPLATE_VERSION = 2
+
+
+class WorldTemplate:
+    '''
+    The objects of a BW4T world (walls, doors, area tiles, block prospects
+    and ghost blocks) as they are added to a WorldBuilder, compiled so that
+    they can be stored on disk and used for new builders.
+    Compiling resolves the constructor arguments of every object, which
+    the WorldBuilder otherwise does for every object of every world.
+    RandomProperty values and prospect probabilities are kept, so the
+    blocks are still drawn from the random seed of the builder, in the same
+    order as for a builder that added the objects itself.
+    Resolving the arguments repeats what the (private) WorldBuilder code of
+    MATRX does. compile therefore checks for every class of object that
+    MATRX itself creates the same object from the same settings. If not,
+    e.g. after a MATRX upgrade, the template keeps the settings as they are
+    and MATRX creates the objects as usual.
+    '''
+    def __init__(self, objects:List[dict]):
+        '''
+        @param objects the compiled object settings, see compile
+        '''
+        self._objects = objects
+
+    @staticmethod
+    def key(worldsettings:dict)->str:
+        '''
+        @return hash of the LAYOUT_SETTINGS of worldsettings, of the MATRX
+        version and of the TEMPLATE_VERSION
+        '''
+        layout = {name: worldsettings[name] for name in LAYOUT_SETTINGS}
+        try:
+            matrx_version = metadata.version('matrx')
+        except metadata.PackageNotFoundError:
+            matrx_version = None
+        text = json.dumps([layout, matrx_version, TEMPLATE_VERSION], sort_keys=True, default=str)
+        return hashlib.sha1(text.encode()).hexdigest()
+
+    @staticmethod
+    def compile(builder:WorldBuilder)->'WorldTemplate':
+        '''
+        @param builder a WorldBuilder to which the objects were added
+        @return template with the objects of builder
+        '''
+        argspecs = {}
+        objects = []
+        for settings in builder.object_settings:
+            callable_class = settings['callable_class']
+            if callable_class not in argspecs:
+                argspecs[callable_class] = inspect.getfullargspec(callable_class)
+            compiled = {'callable_class': callable_class,
+                        'constructor_args': WorldTemplate._constructorArgs(settings, argspecs[callable_class])}
+            if 'probability' in settings:
+                compiled['probability'] = settings['probability']
+            objects.append(compiled)
+        if not WorldTemplate._sameAsMatrx(builder, objects):
+            warnings.warn("MATRX creates objects differently than WorldTemplate expects, "
+                          "the template is stored without compiling the objects")
+            return WorldTemplate(list(builder.object_settings))
+        return WorldTemplate(objects)
+
+    @staticmethod
+    def _sameAsMatrx(builder:WorldBuilder, objects:List[dict])->bool:
+        '''
+        @param builder a BW4TWorldBuilder to which the objects were added
+        @param objects the compiled object_settings of builder
+        @return true if, for the first object of every class, the compiled
+        object is created the same as MATRX creates it from its settings.
+        The random generator of builder is left as it was.
+        '''
+        checked = set()
+        rng_state = builder.rng.get_state()
+        try:
+            for settings, compiled in zip(builder.object_settings, objects):
+                if settings['callable_class'] in checked:
+                    continue
+                checked.add(settings['callable_class'])
+                # without probability, so that both are always created
+                settings = {name: value for name, value in settings.items() if name != 'probability'}
+                compiled = {name: value for name, value in compiled.items() if name != 'probability'}
+                builder.rng.set_state(rng_state)
+                expected = WorldBuilder._WorldBuilder__create_env_object(builder, settings)
+                builder.rng.set_state(rng_state)
+                created = builder._WorldBuilder__create_env_object(compiled)
+                if type(created) is not type(expected) or created.properties != expected.properties:
+                    return False
+        finally:
+            builder.rng.set_state(rng_state)
+        return True
+
+    @staticmethod
+    def _constructorArgs(settings:dict, argspec)->Dict[str,object]:
+        '''
+        @return the arguments for the constructor of the object, in the order
+        that WorldBuilder uses. This order matters, as it is the order in
+        which the RandomProperty values are drawn.
+        '''
+        callable_class = settings['callable_class']
+        custom_props = settings['custom_properties']
+        customizable_props = settings['customizable_properties']
+        mandatory_props = settings['mandatory_properties']
+        if callable_class == EnvObject:
+            return {'location': mandatory_props['location'],
+                    'name': mandatory_props['name'],
+                    'class_callable': callable_class,
+                    'customizable_properties': customizable_props,
+                    'is_traversable': mandatory_props['is_traversable'],
+                    'is_movable': mandatory_props['is_movable'],
+                    'visualize_size': mandatory_props['visualize_size'],
+                    'visualize_shape': mandatory_props['visualize_shape'],
+                    'visualize_colour': mandatory_props['visualize_colour'],
+                    'visualize_opacity': mandatory_props['visualize_opacity'],
+                    'visualize_depth': mandatory_props['visualize_depth'],
+                    **custom_props}
+
+        args = OrderedDict({arg: "not_set" for arg in reversed(argspec.args[1:])})
+        if argspec.defaults is not None:
+            for idx, default in enumerate(reversed(argspec.defaults)):
+                args[list(args.keys())[idx]] = default
+        given_args = {**mandatory_props, **custom_props}
+        for arg, default in args.items():
+            if default == "not_set" and arg not in given_args.keys():
+                raise Exception(f"Cannot create environment object of type {callable_class.__name__} with name "
+                                f"{mandatory_props['name']}, as its constructor requires the argument named {arg} "
+                                f"which is not given as a property.")
+        for arg, val in given_args.items():
+            if val is not None:
+                args[arg] = val
+        return args
+
+    def apply(self, builder:WorldBuilder, room_colors:Dict[str,str]=None):
+        '''
+        Makes the objects of this the objects of builder. builder must be
+        a BW4TWorldBuilder, which can create compiled objects. Objects
+        that are not compiled are created by MATRX.
+        @param room_colors dict with room names as keys and the colour of
+        the area tiles of that room as values, None to keep the colours of the template
+        '''
+        objects = list(self._objects)
+        if room_colors is not None:
+            for idx, obj in enumerate(objects):
+                if obj['callable_class'] == AreaTile:
+                    objects[idx] = WorldTemplate._recolored(obj, room_colors)
+        builder.object_settings = objects
+
+    @staticmethod
+    def _recolored(obj:dict, room_colors:Dict[str,str])->dict:
+        '''
+        @param obj compiled or plain settings of an AreaTile
+        @return copy of obj with the colour of its room, obj itself if its room has no colour
+        '''
+        if 'constructor_args' in obj:
+            args = obj['constructor_args']
+            if args.get('room_name') not in room_colors:
+                return obj
+            return {**obj, 'constructor_args': OrderedDict(args, visualize_colour=room_colors[args['room_name']])}
+        room_name = obj['custom_properties'].get('room_name')
+        if room_name not in room_colors:
+            return obj
+        return {**obj, 'mandatory_properties': {**obj['mandatory_properties'], 'visualize_colour': room_colors[room_name]}}
+
+    def save(self, filename:str):
+        '''
+        Writes the template to filename. The file is replaced at once, so
+        other processes never read a partly written template.
+        '''
+        directory = os.path.dirname(os.path.abspath(filename))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(self._objects, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, filename)
+
+    @staticmethod
+    def load(filename:str)->'WorldTemplate':
+        with open(filename, 'rb') as f:
+            return WorldTemplate(pickle.load(f))
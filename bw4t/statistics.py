@@ -1,4 +1,5 @@
-from typing import final, List, Dict, Final
+from typing import final, List, Dict, Final, Iterable, Iterator, Tuple
+from concurrent.futures import ProcessPoolExecutor
 import sys
 import csv
 import os
@@ -7,7 +8,12 @@ MOVES=['MoveNorth','MoveNorthEast','MoveEast','MoveSouthEast',
        'MoveSouth','MoveSouthWest','MoveWest','MoveNorthWest']
 
 class Statistics:
-    def __init__(self, filename:str):
+    # Ways to read the log file, see __init__
+    STREAM:Final[str]='stream'
+    TABLE:Final[str]='table'
+    PANDAS:Final[str]='pandas'
+
+    def __init__(self, filename:str, mode:str=STREAM):
         '''
         @param filename the path to the csv file to read.
         It  is assumed that first row of the file contains the element headers
@@ -19,11 +25,37 @@ class Statistics:
 
         done is True only in the last row.
         drops contains number of drops IN DROP ZONE.
+        @param mode how to read the file.
+        * STREAM reads the rows one by one and analyses them in a single pass,
+        using constant memory. The rows are not kept.
+        * TABLE also keeps all rows in memory, as list of dicts in _contents.
+        * PANDAS reads the file as a pandas DataFrame (available with getTable)
+        and analyses it with vectorized operations.
         '''
         self._filename=filename
-        self._contents=self._read()
-        self._analyse()
-        
+        self._table=None
+        if mode==Statistics.STREAM:
+            self._analyse(self._rows())
+        elif mode==Statistics.TABLE:
+            self._contents=self._read()
+            self._analyse(self._contents)
+        elif mode==Statistics.PANDAS:
+            self._analyseTable()
+        else:
+            raise ValueError("Unknown mode "+str(mode))
+
+    def _rows(self)->Iterator[Dict[str,str]]:
+        '''
+        read contents from csv file, one row at a time.
+        @return generator of dictionaries, one dictionary for each row.
+        See _read for the contents of the dictionaries.
+        '''
+        with open(self._filename) as csvfile:
+            reader = csv.reader(csvfile, delimiter=';', quotechar="'")
+            header=next(reader, [])
+            for row in reader:
+                yield {header[i]: row[i] for i in range(len(header))}
+
     def _read(self)->List[Dict[str,str]]:
         '''
         read contents from csv file
@@ -35,62 +67,96 @@ class Statistics:
         eg if file has header "name","id" and a row "jan,12" then the dict
         for that row will be {'name':jan, 'id':12}.
         '''
-        header:List[str]=[]
-        contents:List[Dict[str,str]]=[]
-        with open(self._filename) as csvfile:
-            reader = csv.reader(csvfile, delimiter=';', quotechar="'")
-            for row in reader:
-                if header==[]:
-                    header=row
-                    continue
-                res = {header[i]: row[i] for i in range(len(header))} 
-                contents.append(res)
-        return contents
+        return list(self._rows())
 
-    def _analyse(self):
+    def _analyse(self, rows:Iterable[Dict[str,str]]):
         '''
-        analyse the performance log dictionary contained in _contents.
-        Dict is assumed to have keys like 
+        analyse the performance log rows in a single pass.
+        Each row is a dict assumed to have keys like 
         done;agent1_344_msgs;agent1_344_drops;agent2_345_msgs;
         agent2_345_drops;human1_346_msgs;human1_346_drops;
         agent1_344_acts;agent2_345_acts;human1_346_acts;world_nr;tick_nr
- 
-        '''
-        agents=self.getAgents()
-        self._moves={agent:0 for agent in agents}
-        self._messages={agent:0 for agent in agents}
-        self._drops={agent:0 for agent in agents}
-        for row in self._contents:
-            for agent in agents:
+        Only the last row is kept, in _last.
+        '''
+        self._agents=[]
+        self._moves={}
+        self._messages={}
+        self._drops={}
+        self._last=None
+        for row in rows:
+            if self._last is None:
+                self._agents=[header[:len(header)-5] for header in row.keys() if header.endswith("_acts")]
+                self._moves={agent:0 for agent in self._agents}
+                self._messages={agent:0 for agent in self._agents}
+                self._drops={agent:0 for agent in self._agents}
+            for agent in self._agents:
                 if row[agent+'_acts']  in MOVES:
                     self._moves[agent] += 1
                 if 'DropObject'==row[agent+'_acts']:
                     self._drops[agent]+=1
                 self._messages[agent] = row[agent+'_mssg']
-                
+            self._last=row
+
+    def _analyseTable(self):
+        '''
+        analyse the performance log as a pandas DataFrame, with
+        vectorized operations per agent column instead of a loop over the rows.
+        '''
+        table=self.getTable()
+        self._agents=[header[:len(header)-5] for header in table.columns if header.endswith("_acts")]
+        if len(table)==0:
+            self._agents=[]
+        self._moves={agent:int(table[agent+'_acts'].isin(MOVES).sum()) for agent in self._agents}
+        self._drops={agent:int((table[agent+'_acts']=='DropObject').sum()) for agent in self._agents}
+        self._messages={agent:table[agent+'_mssg'].iloc[-1] for agent in self._agents}
+        self._last=table.iloc[-1].to_dict() if len(table)>0 else None
+
+    def getTable(self):
+        '''
+        @return the full log as pandas DataFrame, one row per log row and
+        one (string) column per header. The table is read once and then kept.
+        Requires pandas.
+        '''
+        if self._table is None:
+            import pandas as pd
+            self._table=pd.read_csv(self._filename, sep=';', quotechar="'", dtype=str, keep_default_na=False)
+        return self._table
+
     def getLastTick(self):
         '''
         @return tick nr of last line
         '''
-        return self._contents[-1]['tick_nr']        
+        return self._last['tick_nr']        
     
     def isSucces(self):
         '''
         return 'done' field of last row 
         '''
-        return self._contents[len(self._contents)-1]['done']
+        return self._last['done']
     
     def getAgents(self):
         '''
         @return list of agents in the contents
         '''
-        if len(self._contents)==0:
-            return []
-        agents =[]
-        for header in self._contents[0].keys():
-            if header.endswith("_acts"):
-                agents.append(header[:len(header)-5])
-        return agents
+        return list(self._agents)
+
+    def getMoves(self)->Dict[str,int]:
+        '''
+        @return dict with for each agent the number of ticks with a move action
+        '''
+        return dict(self._moves)
+
+    def getDrops(self)->Dict[str,int]:
+        '''
+        @return dict with for each agent the number of ticks with a DropObject action
+        '''
+        return dict(self._drops)
+
+    def getMessages(self)->Dict[str,str]:
+        '''
+        @return dict with for each agent the message count in the last row
+        '''
+        return dict(self._messages)
                 
     
     def __str__(self):
@@ -102,11 +168,174 @@ class Statistics:
             +"\nmoves:"+str(self._moves)\
             +"\ntotal moves:"+str(sum(self._moves.values()))\
             +"\nlast tick:"+str(self.getLastTick())
-        
+
+
+def _isLog(path:str)->bool:
+    '''
+    @param path a csv file
+    @return true if the file has the header of a BW4TLogger log:
+    starting with done and ending with world_nr;tick_nr
+    '''
+    try:
+        with open(path) as csvfile:
+            header=csvfile.readline().strip()
+    except (OSError, UnicodeDecodeError):
+        return False
+    return header.startswith('done;') and header.endswith(';world_nr;tick_nr')
+
+
+def _summarise(path:str)->List[Dict[str,object]]:
+    '''
+    Parses one log. This is a module function so that it can be
+    sent to the worker processes of StatisticsIndex.
+    @param path the log file
+    @return the index rows of the log, one row per agent
+    '''
+    stats=Statistics(path)
+    if stats.getAgents()==[]:
+        return [{'success':'', 'last_tick':'', 'agent':'', 'moves':0, 'drops':0, 'messages':0}]
+    moves, drops, messages = stats.getMoves(), stats.getDrops(), stats.getMessages()
+    return [{'success':stats.isSucces(), 'last_tick':stats.getLastTick(), 'agent':agent,
+             'moves':moves[agent], 'drops':drops[agent], 'messages':messages[agent]}
+            for agent in stats.getAgents()]
+
+
+class StatisticsIndex:
+    '''
+    A compact summary index of a directory with many BW4TLogger csv logs.
+    The index is a csv file with one row per agent per run, holding
+    success, last tick, moves, drops and messages. Queries only read
+    the index; update() only parses logs that are new or changed since
+    they were indexed, using a pool of processes. Only csv files with the
+    header of a BW4TLogger log are indexed, other csv files are skipped.
+    '''
+    INDEX_NAME:Final[str]='bw4t_index.csv'
+    COLUMNS:Final[List[str]]=['file','mtime','size','success','last_tick','agent','moves','drops','messages']
+
+    def __init__(self, directory:str, index_file:str=None, nr_workers:int=None):
+        '''
+        @param directory the directory that is searched (recursively) for csv logs
+        @param index_file the index file. Default is INDEX_NAME in the directory.
+        @param nr_workers the number of processes used for parsing. None uses the number of cpus.
+        '''
+        self._directory=directory
+        self._index_file=index_file if index_file is not None else os.path.join(directory, StatisticsIndex.INDEX_NAME)
+        self._nr_workers=nr_workers
+        self._rows=self._readIndex()
+        # path -> (mtime, size) of the csv files that are not logs
+        self._skipped:Dict[str,Tuple[str,str]]={}
+
+    def _readIndex(self)->List[Dict[str,str]]:
+        '''
+        @return the rows of the index file, or [] if there is no index yet.
+        '''
+        if not os.path.exists(self._index_file):
+            return []
+        with open(self._index_file) as csvfile:
+            return list(csv.DictReader(csvfile, delimiter=';', quotechar="'"))
+
+    def _logs(self)->Dict[str,Tuple[str,str]]:
+        '''
+        @return dict with as keys the paths of all logs, relative to the
+        directory, and as values their (mtime, size) as strings
+        '''
+        logs={}
+        index=os.path.abspath(self._index_file)
+        for root, dirs, files in os.walk(self._directory):
+            for name in files:
+                path=os.path.join(root, name)
+                if not name.endswith('.csv') or os.path.abspath(path)==index:
+                    continue
+                stat=os.stat(path)
+                logs[os.path.relpath(path, self._directory)]=(str(stat.st_mtime_ns), str(stat.st_size))
+        return logs
+
+    def update(self)->int:
+        '''
+        Brings the index up to date with the logs in the directory:
+        new and changed logs are parsed, removed logs are dropped.
+        The index file is only rewritten if something changed.
+        @return the number of logs that were parsed
+        '''
+        logs=self._logs()
+        indexed={row['file']:(row['mtime'], row['size']) for row in self._rows}
+        # csv files that are not logs, such as profiles or exports, are checked once per version and left out
+        for file, version in list(logs.items()):
+            if indexed.get(file)!=version and self._skipped.get(file)!=version \
+                    and not _isLog(os.path.join(self._directory, file)):
+                self._skipped[file]=version
+            if self._skipped.get(file)==version:
+                del logs[file]
+        todo=sorted(file for file, version in logs.items() if indexed.get(file)!=version)
+        removed=set(indexed.keys())-set(logs.keys())
+        if todo==[] and len(removed)==0:
+            return 0
+
+        paths=[os.path.join(self._directory, file) for file in todo]
+        if self._nr_workers==1:
+            summaries=list(map(_summarise, paths))
+        else:
+            with ProcessPoolExecutor(max_workers=self._nr_workers) as pool:
+                summaries=list(pool.map(_summarise, paths, chunksize=16))
+
+        changed=set(todo)|removed
+        self._rows=[row for row in self._rows if row['file'] not in changed]
+        for file, summary in zip(todo, summaries):
+            for row in summary:
+                self._rows.append({'file':file, 'mtime':logs[file][0], 'size':logs[file][1],
+                                   **{key:str(value) for key, value in row.items()}})
+        self._writeIndex()
+        return len(todo)
+
+    def _writeIndex(self):
+        tmp=self._index_file+'.tmp'
+        with open(tmp, 'w', newline='') as csvfile:
+            writer=csv.DictWriter(csvfile, fieldnames=StatisticsIndex.COLUMNS, delimiter=';', quotechar="'")
+            writer.writeheader()
+            writer.writerows(self._rows)
+        os.replace(tmp, self._index_file)
+
+    def getRuns(self)->Dict[str,Dict[str,object]]:
+        '''
+        @return dict with for each indexed log (path relative to the directory)
+        a dict with keys success, last_tick and agents. agents is
+        a dict with for each agent a dict with moves, drops and messages.
+        Values are as in the log, so strings for success and last_tick.
+        '''
+        runs={}
+        for row in self._rows:
+            run=runs.setdefault(row['file'], {'success':row['success'], 'last_tick':row['last_tick'], 'agents':{}})
+            if row['agent']!='':
+                run['agents'][row['agent']]={'moves':int(row['moves']), 'drops':int(row['drops']),
+                                             'messages':int(row['messages'])}
+        return runs
+
+    def getTable(self):
+        '''
+        @return the index as pandas DataFrame, one row per agent per run.
+        Requires pandas.
+        '''
+        import pandas as pd
+        return pd.DataFrame(self._rows, columns=StatisticsIndex.COLUMNS)
+
+    def __str__(self):
+        runs=self.getRuns()
+        successes=[run for run in runs.values() if run['success']=='True']
+        ticks=[int(run['last_tick']) for run in runs.values() if run['last_tick']!='']
+        return "Statistics index "+self._index_file\
+            +"\nruns:"+str(len(runs))\
+            +"\nsuccesses:"+str(len(successes))\
+            +"\nmean last tick:"+str(sum(ticks)/len(ticks) if len(ticks)>0 else None)
+
+
 if __name__ == "__main__":
     if len(sys.argv)!=2:
-        raise ValueError("usage: "+sys.argv[0]+" <filename>")
+        raise ValueError("usage: "+sys.argv[0]+" <filename or directory>")
     print (os.getcwd())
-    print(Statistics(sys.argv[1]))
+    if os.path.isdir(sys.argv[1]):
+        index=StatisticsIndex(sys.argv[1])
+        print("parsed", index.update(), "logs")
+        print(index)
+    else:
+        print(Statistics(sys.argv[1]))
     
-    
\ No newline at end of file